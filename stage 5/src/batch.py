@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+batch.py - Stage 5 (Variant 27)
+
+Batch mode: resolve many configs in one run.
+
+Every config is one job, run in a process pool. All jobs share the
+manifest cache and the mirror pool (both safe to use from several
+processes), so a repository fetched by one job is not fetched again by
+the next. Each job writes its usual output (graph, order, exports)
+into its own directory under the output directory, with the printed
+report in report.txt.
+
+When all jobs are done their graphs are merged (every edge once; the
+"ROOT" node of the real mode becomes the config's package_name) and
+written as combined.* exports, next to summary.json with per-job
+timings, sizes and errors.
+
+Usage:
+  python src/batch.py CONFIG_OR_DIR [...] [--out DIR] [--workers N]
+                      [--cache-dir DIR] [--mirror-dir DIR] [--format FMT ...]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from cargo_parser import FETCH_STATS
+from exporters import FORMATS, export_graph
+from main import (
+    load_config,
+    validate_config,
+    load_edges,
+    reduce_edges,
+    report,
+    print_cache_stats,
+    print_fetch_stats
+)
+from manifest_cache import DEFAULT_CACHE_DIR
+from mirror_pool import DEFAULT_MIRROR_DIR
+from snapshot import GraphSnapshot
+
+
+DEFAULT_OUTPUT_DIR = "batch_out"
+# Config fields holding paths, resolved against the config's directory
+PATH_FIELDS = ("test_graph", "cargo_lock", "sparse_index", "cargo_order", "snapshot")
+# load_edges reads its sources from the config when these are unset
+NO_ARGS = argparse.Namespace(test_graph=None, cargo_lock=None, sparse_index=None)
+
+
+def find_configs(paths):
+    """Config files from files and directories (*.json, sorted), each once."""
+    configs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            configs.extend(sorted(path.glob("*.json")))
+        elif path.exists():
+            configs.append(path)
+        else:
+            raise FileNotFoundError("Config not found: {}".format(path))
+    return list(dict.fromkeys(p.resolve() for p in configs))
+
+
+def job_dirs(configs, out_dir: Path):
+    """One output directory per config, named after it (numbered if taken)."""
+    dirs = []
+    seen = Counter()
+    for config in configs:
+        seen[config.stem] += 1
+        name = config.stem if seen[config.stem] == 1 else f"{config.stem}-{seen[config.stem]}"
+        dirs.append(out_dir / name)
+    return dirs
+
+
+def prepare_config(config: Path, job_dir: Path, cache_dir, mirror_dir) -> dict:
+    """
+    Load a job's config: relative paths are taken from the config's
+    directory, outputs go to job_dir and the shared caches are used
+    unless the config names its own.
+    """
+    cfg = load_config(config)
+    validate_config(cfg)
+    for field in PATH_FIELDS:
+        if cfg.get(field) and not Path(cfg[field]).is_absolute():
+            cfg[field] = str(config.parent / cfg[field])
+    cfg["output_image_name"] = str(job_dir / Path(cfg["output_image_name"]).name)
+    cfg.setdefault("cache_dir", str(cache_dir))
+    cfg.setdefault("mirror_dir", str(mirror_dir))
+    return cfg
+
+
+def run_job(config, job_dir, cache_dir, mirror_dir) -> dict:
+    """
+    Build, report and export one config, printing into job_dir/report.txt.
+    Never raises: failures are returned in "error".
+    """
+    config, job_dir = Path(config), Path(job_dir)
+    result = {"config": str(config), "output_dir": str(job_dir), "ok": False,
+              "error": None, "nodes": 0, "edges": 0, "clones": 0,
+              "load_seconds": 0.0, "report_seconds": 0.0}
+    start = time.perf_counter()
+    clones = FETCH_STATS.clones
+    job_dir.mkdir(parents=True, exist_ok=True)
+
+    with (job_dir / "report.txt").open("w", encoding="utf-8") as log, \
+            redirect_stdout(log), redirect_stderr(log):
+        try:
+            cfg = prepare_config(config, job_dir, cache_dir, mirror_dir)
+            snapshot = GraphSnapshot(cfg["snapshot"]) if cfg.get("snapshot") else None
+
+            edges, cache, edge_kind, root = load_edges(cfg, NO_ARGS, snapshot)
+            edges = reduce_edges(cfg, edges)
+            loaded = time.perf_counter()
+            report(cfg, edges, snapshot, None, edge_kind, root)
+            result["report_seconds"] = round(time.perf_counter() - loaded, 3)
+            result["load_seconds"] = round(loaded - start, 3)
+
+            if cache is not None:
+                print_cache_stats(cache)
+            if FETCH_STATS.clones > clones:
+                print_fetch_stats(FETCH_STATS.as_dict())
+
+            if root == "ROOT":
+                name = cfg["package_name"]
+                edges = [(name if s == "ROOT" else s, name if t == "ROOT" else t)
+                         for s, t in edges]
+            edges = list(dict.fromkeys(edges))
+            result.update(ok=True, package=cfg["package_name"], edges=len(edges),
+                          nodes=len({n for edge in edges for n in edge}))
+            result["graph"] = edges
+        except (Exception, SystemExit) as e:
+            # sys.exit() from the report helpers ends the job, not the worker
+            if isinstance(e, SystemExit):
+                result["error"] = f"exit status {e.code}"
+            else:
+                result["error"] = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+            print(f"ERROR: {result['error']}")
+
+    result["clones"] = FETCH_STATS.clones - clones
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def merge_graphs(graphs):
+    """
+    Union of the job graphs (edges in first-seen order) and, for every
+    crate found in more than one of them, the number of graphs it is in.
+    """
+    edges = list(dict.fromkeys(edge for graph in graphs for edge in graph))
+    seen = Counter(n for graph in graphs for n in {n for edge in graph for n in edge})
+    shared = {name: count for name, count in seen.most_common() if count > 1}
+    return edges, shared
+
+
+def print_progress(done: int, total: int, result: dict):
+    name = Path(result["output_dir"]).name
+    if result["ok"]:
+        status = f"{result['edges']} edges"
+    else:
+        status = f"FAILED ({result['error']})"
+    print(f"[{done}/{total}] {name}: {status} in {result['seconds']:.2f} s", flush=True)
+
+
+def print_batch_summary(results, combined, shared, elapsed: float):
+    print("\n=== Batch Jobs ===")
+    print(f"{'job':<24} {'nodes':>7} {'edges':>8} {'load s':>8} {'report s':>9} {'total s':>8}")
+    for r in results:
+        name = Path(r["output_dir"]).name
+        print(f"{name:<24} {r['nodes']:>7} {r['edges']:>8} {r['load_seconds']:>8.2f} "
+              f"{r['report_seconds']:>9.2f} {r['seconds']:>8.2f}"
+              + ("" if r["ok"] else "  FAILED"))
+
+    failed = sum(not r["ok"] for r in results)
+    print("\n=== Batch Summary ===")
+    print(f"Jobs: {len(results)}   |   Failed: {failed}   |   Wall time: {elapsed:.2f} s")
+    print(f"Combined graph: {combined['nodes']} nodes, {combined['edges']} edges "
+          f"({len(shared)} crates in more than one graph)")
+    for path in combined["exports"]:
+        print(f"Saved: {path}")
+
+
+def run_batch(configs, out_dir=DEFAULT_OUTPUT_DIR, max_workers=None,
+              cache_dir=DEFAULT_CACHE_DIR, mirror_dir=DEFAULT_MIRROR_DIR, formats=None):
+    """
+    Run every config in a process pool, then merge the graphs.
+    Returns the summary that is also written to out_dir/summary.json.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    dirs = job_dirs(configs, out_dir)
+    start = time.perf_counter()
+
+    results = [None] * len(configs)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(run_job, str(config), str(job_dir), str(cache_dir), str(mirror_dir)): i
+            for i, (config, job_dir) in enumerate(zip(configs, dirs))
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            results[i] = future.result()
+            print_progress(done, len(configs), results[i])
+
+    # Merged in config order, so the output does not depend on scheduling
+    graphs = [r.pop("graph") for r in results if r["ok"]]
+    edges, shared = merge_graphs(graphs)
+    outputs = {fmt: out_dir / f"combined{FORMATS[fmt].suffix}"
+               for fmt in dict.fromkeys(formats or ["d2"])}
+    exports, count = export_graph(edges, outputs)
+    elapsed = time.perf_counter() - start
+
+    combined = {
+        "nodes": len({n for edge in edges for n in edge}),
+        "edges": count,
+        "shared_crates": shared,
+        "exports": [str(path) for path in exports],
+    }
+    summary = {"seconds": round(elapsed, 3), "jobs": results, "combined": combined}
+    (out_dir / "summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    print_batch_summary(results, combined, shared, elapsed)
+    print(f"Summary saved to: {out_dir / 'summary.json'}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dependency Visualizer - batch mode")
+    parser.add_argument("configs", nargs="+",
+                        help="Config files, or directories of *.json configs")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_DIR,
+                        help="Output directory (one subdirectory per config)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR),
+                        help="Manifest cache shared by all jobs")
+    parser.add_argument("--mirror-dir", default=str(DEFAULT_MIRROR_DIR),
+                        help="Mirror pool shared by all jobs")
+    parser.add_argument("--format", action="append", choices=list(FORMATS),
+                        help="Format of the combined export (repeat for several; default: d2)")
+    args = parser.parse_args()
+
+    try:
+        configs = find_configs(args.configs)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    if not configs:
+        parser.error("no configs found")
+
+    summary = run_batch(configs, args.out, args.workers, args.cache_dir,
+                        args.mirror_dir, args.format)
+    if not all(job["ok"] for job in summary["jobs"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
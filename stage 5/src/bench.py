@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+bench.py - Stage 5 (Variant 27)
+
+Micro benchmarks on generated inputs.
+
+Usage:
+  python src/bench.py toml [--deps N] [--manifests N]
+  python src/bench.py index [--crates N] [--dir PATH]
+  python src/bench.py graph [--nodes N] [--edges N]
+  python src/bench.py testgraph [--nodes N] [--depth N]
+  python src/bench.py dyntopo [--nodes N] [--edges N] [--updates N]
+  python src/bench.py server [--port N] [--requests N] [--concurrency N] [--path P ...]
+  python src/bench.py export [--nodes N] [--edges N]
+  python src/bench.py summary [--nodes N] [--edges N]
+  python src/bench.py render [--nodes N] [--edges N] [--tile N] [--tile-by scc|layer]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from pathlib import Path
+
+import cargo_parser
+from d2_exporter import export_to_d2
+from graph import Graph
+from graph_builder import build_bfs_graph, iter_bfs_graph, load_test_graph, IndexedTestGraph
+from topo_sort import topological_sort, transitive_reduction, DynamicTopologicalOrder, CycleError
+from sparse_index import SparseIndex, index_path
+from renderer import Renderer, TILE_BY
+from exporters import FORMATS, export_graph
+from binary_graph import BinaryGraph
+from summarize import summarize, SUMMARY_MODES
+
+
+# -------------------------
+# HELPERS
+# -------------------------
+
+def timed(fn, *args, repeat: int = 1):
+    """Return (best time in seconds, last result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(name, seconds, extra=""):
+    print(f"{name:<32} {seconds * 1000:10.2f} ms  {extra}")
+
+
+# -------------------------
+# TOML PARSER
+# -------------------------
+
+def generate_manifest(n_deps: int, rng: random.Random) -> str:
+    lines = ['[package]', 'name = "bench"', 'version = "0.1.0"', '']
+    tables = ["[dependencies]", "[dev-dependencies]", "[build-dependencies]",
+              "[target.'cfg(unix)'.dependencies]"]
+    per_table = max(1, n_deps // len(tables))
+    idx = 0
+    for table in tables:
+        lines.append(table)
+        for _ in range(per_table):
+            name = f"crate-{idx}"
+            idx += 1
+            if rng.random() < 0.5:
+                lines.append(f'{name} = "{rng.randint(0, 9)}.{rng.randint(0, 99)}"')
+            else:
+                lines.append(f'{name} = {{ version = "1", features = ["a", "b"], optional = true }}')
+        lines.append("")
+    return "\n".join(lines)
+
+
+def bench_toml(args):
+    rng = random.Random(0)
+    manifests = [generate_manifest(args.deps, rng) for _ in range(args.manifests)]
+
+    def run(parse):
+        return sum(len(parse(m)) for m in manifests)
+
+    t_regex, n_regex = timed(run, cargo_parser._parse_regex, repeat=3)
+    t_toml, n_toml = timed(run, cargo_parser.parse_manifest, repeat=3)
+
+    print(f"\n=== TOML parser: {args.manifests} manifests x {args.deps} deps ===")
+    report("regex ([dependencies] only)", t_regex, f"{n_regex} deps")
+    report("tomllib (all tables)", t_toml, f"{n_toml} deps")
+
+
+# -------------------------
+# SPARSE INDEX
+# -------------------------
+
+def generate_index(root: Path, n_crates: int, rng: random.Random):
+    """
+    Write a sparse index fixture: crate-i depends on a few crate-j with
+    j < i, every crate has three versions.
+    """
+    for i in range(n_crates):
+        name = f"crate-{i}"
+        path = root / index_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            for minor in range(3):
+                deps = [
+                    {"name": f"crate-{j}", "req": f"^1.{rng.randint(0, 2)}",
+                     "kind": rng.choice(["normal", "normal", "dev"]),
+                     "optional": False, "features": [], "target": None}
+                    for j in sorted(rng.sample(range(i), min(i, 4)))
+                ]
+                f.write(json.dumps({"name": name, "vers": f"1.{minor}.0",
+                                    "deps": deps, "yanked": False}) + "\n")
+
+
+def bench_index(args):
+    rng = random.Random(0)
+    root = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="sparse_index_"))
+    root.mkdir(parents=True, exist_ok=True)
+    if not any(root.iterdir()):
+        t_gen, _ = timed(generate_index, root, args.crates, rng)
+        report("generate fixture", t_gen, f"{args.crates} crates in {root}")
+
+    top = f"crate-{args.crates - 1}"
+    index = SparseIndex(root, lru_size=args.lru)
+    t_bfs, edges = timed(build_bfs_graph, top, index.loader, args.depth, "")
+
+    print(f"\n=== Sparse index: BFS from {top}, depth {args.depth} ===")
+    report("build_bfs_graph", t_bfs,
+           f"{len(edges)} edges, {len(index.selected)} crates resolved")
+
+
+# -------------------------
+# GRAPH CORE
+# -------------------------
+
+def topological_sort_dicts(edges):
+    """Baseline: the previous dict/set based Kahn's algorithm."""
+    graph = defaultdict(list)
+    indegree = defaultdict(int)
+    nodes = set()
+    for src, dst in edges:
+        graph[src].append(dst)
+        indegree[dst] += 1
+        nodes.add(src)
+        nodes.add(dst)
+    queue = deque([n for n in nodes if indegree[n] == 0])
+    order = []
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for neigh in graph[node]:
+            indegree[neigh] -= 1
+            if indegree[neigh] == 0:
+                queue.append(neigh)
+    return order, len(order) == len(nodes)
+
+
+def generate_dag(n_nodes: int, n_edges: int, rng: random.Random):
+    """Random DAG edges (i -> j with i < j), names like 'crate-42'."""
+    names = [f"crate-{i}" for i in range(n_nodes)]
+    edges = []
+    for _ in range(n_edges):
+        a = rng.randrange(n_nodes - 1)
+        b = rng.randrange(a + 1, n_nodes)
+        edges.append((names[a], names[b]))
+    return edges
+
+
+def measure_memory(fn, *args):
+    """Return (bytes still allocated by fn's result, result)."""
+    tracemalloc.start()
+    result = fn(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def bench_graph(args):
+    rng = random.Random(0)
+    mem_list, edges = measure_memory(generate_dag, args.nodes, args.edges, rng)
+    mem_graph, graph = measure_memory(Graph.from_edges, edges)
+    # Names are shared with the edge list; count the graph's own buffers
+    print(f"\n=== Graph core: {args.nodes} nodes, {args.edges} edges ===")
+    print(f"list of tuples (incl. names)    {mem_list / 2**20:10.1f} MiB")
+    print(f"Graph (ids, offsets, targets)   {mem_graph / 2**20:10.1f} MiB")
+
+    t, _ = timed(Graph.from_edges, edges)
+    report("Graph.from_edges", t)
+    t, _ = timed(topological_sort_dicts, edges)
+    report("topological sort (dicts)", t)
+    t, _ = timed(topological_sort, graph)
+    report("topological sort (Graph)", t)
+    t, reduced = timed(transitive_reduction, graph)
+    report("transitive reduction", t, f"{len(reduced)} of {len(edges)} edges kept")
+    reduced = Graph.from_edges(reduced)
+    t, _ = timed(topological_sort, reduced)
+    report("topological sort (reduced)", t)
+
+    out = Path(tempfile.mkdtemp(prefix="bench_d2_")) / "deps.d2"
+    t, _ = timed(export_to_d2, edges, out)
+    report("export_to_d2 (list)", t)
+    t, _ = timed(export_to_d2, graph, out)
+    report("export_to_d2 (Graph)", t)
+
+
+# -------------------------
+# TEST GRAPH LOADER
+# -------------------------
+
+def generate_test_graph(path: Path, n_nodes: int, rng: random.Random):
+    """A: B C style file, each node pointing to up to 8 later nodes."""
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(n_nodes):
+            deps = " ".join(f"n{rng.randrange(i + 1, n_nodes)}"
+                            for _ in range(rng.randint(0, 8)) if i + 1 < n_nodes)
+            f.write(f"n{i}: {deps}\n")
+
+
+def _run_loader(kind: str, path: str, depth: int, queue):
+    start = time.perf_counter()
+    if kind == "dict":
+        n_edges = len(build_bfs_graph("n0", None, depth, "", load_test_graph(path)))
+    elif kind == "indexed":
+        with IndexedTestGraph(path) as graph:
+            n_edges = len(build_bfs_graph("n0", None, depth, "", graph))
+    else:
+        # BFS generator written straight to D2, no edge list in memory
+        out = Path(path).with_suffix(".d2")
+        with IndexedTestGraph(path) as graph:
+            _, n_edges = export_to_d2(iter_bfs_graph("n0", None, depth, "", graph), out)
+    elapsed = time.perf_counter() - start
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, peak_kib, n_edges))
+
+
+def bench_testgraph(args):
+    path = Path(args.file) if args.file else Path(tempfile.mkdtemp(prefix="test_graph_")) / "graph.txt"
+    if not path.exists():
+        t_gen, _ = timed(generate_test_graph, path, args.nodes, random.Random(0))
+        report("generate file", t_gen, f"{path.stat().st_size / 2**20:.1f} MiB")
+
+    print(f"\n=== Test graph loader: {path}, depth {args.depth} ===")
+    ctx = multiprocessing.get_context("spawn")
+    for kind in ("dict", "indexed", "stream"):
+        # Fresh process per loader so peak RSS is not shared
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_loader, args=(kind, str(path), args.depth, queue))
+        proc.start()
+        elapsed, peak_kib, n_edges = queue.get()
+        proc.join()
+        report(f"load + BFS ({kind})" if kind != "stream" else "BFS -> D2 (stream)", elapsed,
+               f"{n_edges} edges, peak RSS {peak_kib / 1024:.1f} MiB")
+
+
+# -------------------------
+# DYNAMIC TOPOLOGICAL ORDER
+# -------------------------
+
+def bench_dyntopo(args):
+    rng = random.Random(0)
+    edges = generate_dag(args.nodes, args.edges, rng)
+    names = sorted({n for e in edges for n in e})
+    # Shuffle the node order so insertions can point backwards
+    rng.shuffle(edges)
+
+    t_build, dto = timed(DynamicTopologicalOrder.from_edges, edges)
+    t_batch, _ = timed(topological_sort, edges)
+
+    updates = [(rng.choice(names), rng.choice(names)) for _ in range(args.updates)]
+
+    def apply_updates():
+        inserted = cycles = 0
+        for src, dst in updates:
+            try:
+                dto.add_edge(src, dst)
+                inserted += 1
+            except CycleError:
+                cycles += 1
+        return inserted, cycles
+
+    t_dyn, (inserted, cycles) = timed(apply_updates)
+
+    print(f"\n=== Dynamic topological order: {len(names)} nodes, {len(edges)} edges ===")
+    report("build DynamicTopologicalOrder", t_build)
+    report("one batch topological_sort", t_batch)
+    report(f"{args.updates} dynamic updates", t_dyn,
+           f"{inserted} inserted, {cycles} rejected as cycles")
+    report("per update (dynamic)", t_dyn / args.updates)
+    report("per update (batch re-sort)", t_batch,
+           f"~{t_batch * args.updates:.1f} s for all updates")
+
+
+# -------------------------
+# QUERY SERVER
+# -------------------------
+
+async def _server_worker(host, port, paths, count, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    for i in range(count):
+        path = paths[i % len(paths)]
+        start = time.perf_counter()
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+def bench_server(args):
+    latencies = []
+    per_worker = max(1, args.requests // args.concurrency)
+
+    async def run():
+        await asyncio.gather(*(
+            _server_worker(args.host, args.port, args.path, per_worker, latencies)
+            for _ in range(args.concurrency)
+        ))
+
+    elapsed, _ = timed(lambda: asyncio.run(run()))
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    print(f"\n=== Query server {args.host}:{args.port}: {len(latencies)} requests, "
+          f"{args.concurrency} connections ===")
+    report("p50 latency", pct(0.50))
+    report("p99 latency", pct(0.99))
+    report("total", elapsed, f"{len(latencies) / elapsed:.0f} requests/s")
+
+
+# -------------------------
+# EXPORT FORMATS
+# -------------------------
+
+def bench_export(args):
+    rng = random.Random(0)
+    edges = generate_dag(args.nodes, args.edges, rng)
+    work = Path(tempfile.mkdtemp(prefix="bench_export_"))
+    print(f"\n=== Export formats: {args.nodes} nodes, {args.edges} edges ===")
+
+    for fmt, writer in FORMATS.items():
+        path = work / f"deps{writer.suffix}"
+        t, _ = timed(export_graph, edges, {fmt: path})
+        report(f"write {fmt}", t, f"{path.stat().st_size / 2**20:.1f} MiB")
+
+    outputs = {fmt: work / f"all{writer.suffix}" for fmt, writer in FORMATS.items()}
+    t, _ = timed(export_graph, edges, outputs)
+    report("write all (one pass)", t)
+
+    def load_jsonl(path):
+        with path.open(encoding="utf-8") as f:
+            return [(r["src"], r["dst"]) for r in map(json.loads, f)]
+
+    def load_binary(path):
+        with BinaryGraph(path) as graph:
+            return len(graph.edge_ids)
+
+    def load_binary_names(path):
+        with BinaryGraph(path) as graph:
+            return list(graph)
+
+    t, _ = timed(load_jsonl, work / "deps.jsonl")
+    report("reload jsonl", t)
+    t, _ = timed(load_binary, work / "deps.bin", repeat=5)
+    report("reload bin (mmap, edge ids)", t)
+    t, _ = timed(load_binary_names, work / "deps.bin")
+    report("reload bin (name pairs)", t)
+
+
+# -------------------------
+# SUMMARIES
+# -------------------------
+
+def bench_summary(args):
+    rng = random.Random(0)
+    edges = generate_dag(args.nodes, args.edges, rng)
+    print(f"\n=== Summaries: {args.nodes} nodes, {args.edges} edges ===")
+    for mode in SUMMARY_MODES:
+        t, out = timed(summarize, edges, mode, edges[0][0], 2, 50)
+        report(mode, t, f"{len(out)} edges left")
+
+
+# -------------------------
+# RENDERING
+# -------------------------
+
+def bench_render(args):
+    rng = random.Random(0)
+    edges = generate_dag(args.nodes, args.edges, rng)
+    work = Path(tempfile.mkdtemp(prefix="bench_render_"))
+    print(f"\n=== Render: {args.nodes} nodes, {args.edges} edges, "
+          f"tiles of {args.tile} nodes ===")
+
+    one = Renderer("python", cache_dir=work / "one", max_workers=1)
+    t, _ = timed(one.render, edges, work / "one.svg", "layer", args.nodes)
+    report("python layout (one image)", t)
+
+    for workers in (1, None):
+        tiled = Renderer("python", cache_dir=work / f"tiled{workers}", max_workers=workers)
+        t, results = timed(tiled.render, edges, work / "tiled.svg", args.tile_by, args.tile)
+        report(f"python layout (tiles, {tiled.max_workers} procs)", t, f"{len(results)} tiles")
+
+    t, _ = timed(tiled.render, edges, work / "tiled.svg", args.tile_by, args.tile)
+    report("cached re-render", t, f"{tiled.hits} hits")
+
+
+# -------------------------
+# MAIN PROGRAM
+# -------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Dependency Visualizer - benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("toml", help="tomllib parser vs the old regex")
+    p.add_argument("--deps", type=int, default=200)
+    p.add_argument("--manifests", type=int, default=1000)
+    p.set_defaults(func=bench_toml)
+
+    p = sub.add_parser("index", help="BFS over a generated sparse index")
+    p.add_argument("--crates", type=int, default=20000)
+    p.add_argument("--depth", type=int, default=6)
+    p.add_argument("--lru", type=int, default=4096)
+    p.add_argument("--dir", help="reuse / create the fixture here")
+    p.set_defaults(func=bench_index)
+
+    p = sub.add_parser("graph", help="CSR graph vs list of tuples")
+    p.add_argument("--nodes", type=int, default=100000)
+    p.add_argument("--edges", type=int, default=1000000)
+    p.set_defaults(func=bench_graph)
+
+    p = sub.add_parser("testgraph", help="dict vs indexed mmap loader vs streamed export")
+    p.add_argument("--nodes", type=int, default=2000000)
+    p.add_argument("--depth", type=int, default=3)
+    p.add_argument("--file", help="existing / output A: B C file")
+    p.set_defaults(func=bench_testgraph)
+
+    p = sub.add_parser("dyntopo", help="dynamic topo order vs batch re-sorts")
+    p.add_argument("--nodes", type=int, default=100000)
+    p.add_argument("--edges", type=int, default=300000)
+    p.add_argument("--updates", type=int, default=1000)
+    p.set_defaults(func=bench_dyntopo)
+
+    p = sub.add_parser("server", help="latency / throughput of a running query server")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--requests", type=int, default=10000)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--path", nargs="+", default=["/health", "/topo"])
+    p.set_defaults(func=bench_server)
+
+    p = sub.add_parser("export", help="write / reload time of every export format")
+    p.add_argument("--nodes", type=int, default=100000)
+    p.add_argument("--edges", type=int, default=1000000)
+    p.set_defaults(func=bench_export)
+
+    p = sub.add_parser("summary", help="k-hop / reduction / collapse / top-N on a large DAG")
+    p.add_argument("--nodes", type=int, default=20000)
+    p.add_argument("--edges", type=int, default=100000)
+    p.set_defaults(func=bench_summary)
+
+    p = sub.add_parser("render", help="built-in layout: one image vs parallel tiles vs cache")
+    p.add_argument("--nodes", type=int, default=3000)
+    p.add_argument("--edges", type=int, default=6000)
+    p.add_argument("--tile", type=int, default=200)
+    p.add_argument("--tile-by", choices=TILE_BY, default="layer")
+    p.set_defaults(func=bench_render)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+binary_graph.py - Stage 5 (Variant 27)
+
+Compact binary graph format that can be memory-mapped and used
+without parsing.
+
+Layout (little-endian):
+- header: 8-byte magic b"DVGRAPH1", then three uint64: number of
+  nodes, number of edges, byte offset of the string table
+- edges: one int32 (source id, target id) pair per edge, in stream order
+- string table: int32 offsets (number of nodes + 1) into the UTF-8
+  blob of node names that follows; node ids are indexes into it
+
+The edge pairs are written while the edge stream runs and the string
+table at the end, after which the header is patched. BinaryGraph maps
+the file and exposes the edge pairs as a zero-copy int32 memoryview;
+names are decoded only when needed.
+"""
+
+import hashlib
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from edge_stream import CHUNK_LINES
+from graph import Graph
+
+
+MAGIC = b"DVGRAPH1"
+HEADER = struct.Struct("<8sQQQ")
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def is_binary_graph(path) -> bool:
+    """True if the file starts with the binary graph magic."""
+    with Path(path).open("rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class BinaryWriter:
+    """Writer of the shared edge stream interface for the binary format."""
+
+    binary = True
+    suffix = ".bin"
+
+    def start(self, out, chunk_lines: int = CHUNK_LINES):
+        self.out = out
+        self.chunk_edges = chunk_lines
+        self.ids = {}
+        self.names = []
+        self.num_edges = 0
+        self._pairs = array("i")
+        out.write(HEADER.pack(MAGIC, 0, 0, 0))
+
+    def node(self, name, parent):
+        self.ids[name] = len(self.names)
+        self.names.append(name)
+
+    def edge(self, src, dst):
+        self._pairs.append(self.ids[src])
+        self._pairs.append(self.ids[dst])
+        self.num_edges += 1
+        if len(self._pairs) >= 2 * self.chunk_edges:
+            self._flush()
+
+    def _flush(self):
+        self.out.write(_little_endian(self._pairs))
+        del self._pairs[:]
+
+    def finish(self):
+        self._flush()
+        table_offset = HEADER.size + 8 * self.num_edges
+
+        blob = bytearray()
+        offsets = array("i", [0])
+        for name in self.names:
+            blob += str(name).encode("utf-8")
+            offsets.append(len(blob))
+        self.out.write(_little_endian(offsets))
+        self.out.write(blob)
+
+        self.out.seek(0)
+        self.out.write(HEADER.pack(MAGIC, len(self.names), self.num_edges, table_offset))
+
+
+class BinaryGraph:
+    """
+    Read-only view of a binary graph file.
+
+    edge_ids is an int32 memoryview over the mapped file (source, target,
+    source, target, ...); get() makes it usable as a test graph for
+    build_bfs_graph, through a CSR Graph built on first use.
+    """
+
+    def __init__(self, path):
+        p = Path(path)
+        if not p.exists():
+            raise FileNotFoundError("Binary graph file not found: {}".format(path))
+
+        self._file = p.open("rb")
+        size = p.stat().st_size
+        if size < HEADER.size:
+            self._file.close()
+            raise ValueError("Not a binary graph file: {}".format(path))
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.num_nodes, self.num_edges, table = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Not a binary graph file: {}".format(path))
+
+        view = memoryview(self._map)
+        edges = view[HEADER.size:table]
+        offsets = view[table:table + 4 * (self.num_nodes + 1)]
+        if sys.byteorder == "little":
+            self.edge_ids = edges.cast("i")
+            self._offsets = offsets.cast("i")
+        else:
+            self.edge_ids = array("i", edges.tobytes())
+            self.edge_ids.byteswap()
+            self._offsets = array("i", offsets.tobytes())
+            self._offsets.byteswap()
+        self._blob = table + 4 * (self.num_nodes + 1)
+        self._names = None
+        self._graph = None
+
+    def name(self, i: int) -> str:
+        start = self._blob + self._offsets[i]
+        end = self._blob + self._offsets[i + 1]
+        return self._map[start:end].decode("utf-8")
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = [self.name(i) for i in range(self.num_nodes)]
+        return self._names
+
+    def __len__(self):
+        return self.num_edges
+
+    def __iter__(self):
+        """(source, target) name pairs in stored order."""
+        names = self.names
+        ids = self.edge_ids
+        for k in range(0, 2 * self.num_edges, 2):
+            yield names[ids[k]], names[ids[k + 1]]
+
+    def to_graph(self) -> Graph:
+        if self._graph is None:
+            self._graph = Graph.from_ids(self.names, array("i", self.edge_ids[0::2]),
+                                         array("i", self.edge_ids[1::2]))
+        return self._graph
+
+    def get(self, node, default=None):
+        return self.to_graph().get(node, default)
+
+    def fingerprint(self, node) -> str:
+        """Change stamp for incremental rebuilds: hash of the node's targets."""
+        deps = self.get(node)
+        if deps is None:
+            return "missing"
+        return hashlib.sha256("\n".join(deps).encode("utf-8")).hexdigest()[:16]
+
+    def __contains__(self, node):
+        return node in self.to_graph().ids
+
+    def close(self):
+        # The memoryviews must go before the map can be closed
+        for view in ("edge_ids", "_offsets"):
+            value = getattr(self, view, None)
+            if isinstance(value, memoryview):
+                value.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,94 @@
+"""
+cargo_order.py - Stage 5 (Variant 27)
+
+Loads Cargo's own build order from files produced offline:
+- `cargo build --unit-graph -Z unstable-options` JSON
+- `cargo metadata --format-version 1` JSON
+- a plain text file with one crate name per line
+
+For the JSON formats the order of the units / packages in the file is
+kept, fixed up only where a crate comes before one of its
+dependencies in Cargo's graph.
+"""
+
+import json
+from pathlib import Path
+from urllib.parse import urlparse
+
+from graph import Graph
+from topo_sort import topological_sort
+
+
+def package_name(pkg_id: str) -> str:
+    """
+    Crate name from a Cargo package id, old or new style:
+    'serde 1.0.0 (registry+https://...)'
+    'registry+https://github.com/rust-lang/crates.io-index#serde@1.0.0'
+    'path+file:///work/foo#0.1.0'
+    """
+    if "#" not in pkg_id:
+        return pkg_id.split()[0]
+    url, fragment = pkg_id.rsplit("#", 1)
+    if "@" in fragment:
+        return fragment.split("@", 1)[0]
+    return Path(urlparse(url.split("+", 1)[-1]).path).name
+
+
+def _build_order(names, dependencies):
+    """
+    names: crate name per unit / package, in file order
+    dependencies: list of (unit index, dependency unit index)
+    Returns the unique crate names in file order, with a crate moved
+    only where it comes before one of its dependencies: among the crates
+    whose dependencies are placed, the earliest in the file goes next,
+    so a file that is already dependencies-first is kept as it is.
+    """
+    edges = [(names[b], names[a]) for a, b in dependencies if names[a] != names[b]]
+    graph = Graph.from_edges(edges, nodes=names)
+    order, ok = topological_sort(graph, "discovery")
+    if not ok:
+        # Same-name crates of different versions can form a loop:
+        # keep whatever sorted and append the rest in file order
+        placed = set(order)
+        order += [n for n in graph.names if n not in placed]
+    return order
+
+
+def load_unit_graph(data: dict):
+    units = data["units"]
+    names = [package_name(u["pkg_id"]) for u in units]
+    deps = [(i, d["index"]) for i, u in enumerate(units) for d in u.get("dependencies", [])]
+    return _build_order(names, deps)
+
+
+def load_metadata(data: dict):
+    name_of = {p["id"]: p["name"] for p in data["packages"]}
+    nodes = (data.get("resolve") or {}).get("nodes", [])
+    if not nodes:
+        return list(dict.fromkeys(p["name"] for p in data["packages"]))
+
+    index = {node["id"]: i for i, node in enumerate(nodes)}
+    names = [name_of.get(node["id"], package_name(node["id"])) for node in nodes]
+    deps = []
+    for i, node in enumerate(nodes):
+        dep_ids = node.get("dependencies") or [d["pkg"] for d in node.get("deps", [])]
+        deps.extend((i, index[d]) for d in dep_ids if d in index)
+    return _build_order(names, deps)
+
+
+def load_cargo_order(path):
+    """Return Cargo's build order (dependencies first) from a file."""
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError("Cargo order file not found.")
+
+    text = p.read_text(encoding="utf-8")
+    if text.lstrip().startswith("{"):
+        data = json.loads(text)
+        if "units" in data:
+            return load_unit_graph(data)
+        if "packages" in data:
+            return load_metadata(data)
+        raise ValueError("Unknown Cargo JSON format: expected unit graph or metadata.")
+
+    return [line.strip() for line in text.splitlines() if line.strip()]
@@ -4,25 +4,108 @@ cargo_parser.py - Stage 2 (Variant 27)
 Extracts direct dependencies from Cargo.toml or from a test file.
 """
 
+import fnmatch
 import re
 import subprocess
 import tempfile
+import threading
+import time
 import shutil
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import NamedTuple
 
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from manifest_cache import resolve_head
+
+
+class FetchStats:
+    """Counters for the clones done by clone_repository."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clones = 0
+        self.partial = 0
+        self.fallbacks = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, partial: bool, fallback: bool, nbytes: int, seconds: float):
+        with self._lock:
+            self.clones += 1
+            self.partial += int(partial)
+            self.fallbacks += int(fallback)
+            self.bytes += nbytes
+            self.seconds += seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "clones": self.clones,
+            "partial": self.partial,
+            "fallbacks": self.fallbacks,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3)
+        }
+
+
+FETCH_STATS = FetchStats()
+
+# git warnings for a clone that ignored --filter (and got all blobs)
+FILTER_IGNORED = (
+    "filtering not recognized by server",
+    "--filter is ignored in local clones",
+)
 
-def clone_repository(repo_url: str) -> Path:
-    """Clone a git repo into a temp directory."""
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _git(args, cwd=None):
+    return subprocess.run(["git"] + args, check=True, capture_output=True, cwd=cwd)
+
+
+def clone_repository(repo_url: str, sparse: bool = True, fallback: bool = False) -> Path:
+    """
+    Clone a git repo into a temp directory.
+
+    With sparse=True only Cargo.toml is transferred: the clone uses
+    --filter=blob:none and a sparse checkout of /Cargo.toml. Servers
+    without filter support fall back to a plain shallow clone.
+    fallback marks that retry, so one repository counts as one clone.
+    """
     temp_dir = Path(tempfile.mkdtemp(prefix="cargo_repo_"))
+    start = time.perf_counter()
+    partial = False
     try:
-        subprocess.run(
-            ["git", "clone", "--depth=1", repo_url, str(temp_dir)],
-            check=True,
-            capture_output=True
-        )
+        if sparse:
+            result = _git([
+                "clone", "--depth=1", "--filter=blob:none", "--no-checkout",
+                repo_url, str(temp_dir)
+            ])
+            stderr = result.stderr.decode()
+            partial = not any(warning in stderr for warning in FILTER_IGNORED)
+            fallback = not partial
+            _git(["sparse-checkout", "set", "--no-cone", "/Cargo.toml"], cwd=temp_dir)
+            _git(["checkout", "--quiet"], cwd=temp_dir)
+        else:
+            _git(["clone", "--depth=1", repo_url, str(temp_dir)])
     except subprocess.CalledProcessError as e:
         shutil.rmtree(temp_dir)
+        if sparse:
+            # Old git or a server rejecting the filter: plain clone
+            return clone_repository(repo_url, sparse=False, fallback=True)
         raise RuntimeError("Failed to clone repository: {}".format(e.stderr.decode()))
+
+    FETCH_STATS.record(partial, fallback, _dir_size(temp_dir / ".git" / "objects"),
+                       time.perf_counter() - start)
     return temp_dir
 
 
@@ -34,10 +117,102 @@ def find_cargo_files(root: Path) -> Path:
     raise FileNotFoundError("Cargo.toml not found in repository.")
 
 
+class Dependency(NamedTuple):
+    """One dependency entry of a Cargo.toml."""
+    name: str                   # key used in the manifest
+    req: str                    # version requirement, "" if none
+    kind: str = "normal"        # "normal", "dev" or "build"
+    target: str = None          # e.g. "cfg(windows)" for target tables
+    optional: bool = False
+    features: tuple = ()
+    source: str = None          # "path+<dir>" / "git+<url>", None for registry
+    package: str = None         # real crate name when renamed
+    workspace: bool = False     # `workspace = true` inheritance
+
+    @property
+    def crate(self) -> str:
+        return self.package or self.name
+
+
+DEPENDENCY_TABLES = {
+    "dependencies": "normal",
+    "dev-dependencies": "dev",
+    "dev_dependencies": "dev",
+    "build-dependencies": "build",
+    "build_dependencies": "build",
+}
+
+
+def _make_dependency(name, spec, kind, target) -> Dependency:
+    if isinstance(spec, str):
+        return Dependency(name, spec, kind, target)
+
+    source = None
+    if "path" in spec:
+        source = "path+" + spec["path"]
+    elif "git" in spec:
+        source = "git+" + spec["git"]
+
+    return Dependency(
+        name=name,
+        req=spec.get("version", ""),
+        kind=kind,
+        target=target,
+        optional=bool(spec.get("optional", False)),
+        features=tuple(spec.get("features", ())),
+        source=source,
+        package=spec.get("package"),
+        workspace=bool(spec.get("workspace", False))
+    )
+
+
+def _collect(tables: dict, target, out: list):
+    for table, kind in DEPENDENCY_TABLES.items():
+        for name, spec in tables.get(table, {}).items():
+            out.append(_make_dependency(name, spec, kind, target))
+
+
+def parse_manifest(content: str):
+    """
+    Parse Cargo.toml content into a list of Dependency records.
+
+    Covers [dependencies], [dev-dependencies], [build-dependencies],
+    their [target.'cfg(..)'.*] variants, dotted [dependencies.foo]
+    tables and inline tables.
+    """
+    return _manifest_records(_load_toml(content))
+
+
+def _load_toml(content: str) -> dict:
+    if tomllib is None:
+        raise RuntimeError("Parsing Cargo.toml needs Python 3.11+ or the 'tomli' "
+                           "package (pip install tomli).")
+    return tomllib.loads(content)
+
+
+def _manifest_records(data: dict):
+    records = []
+    _collect(data, None, records)
+    for target, tables in data.get("target", {}).items():
+        _collect(tables, target, records)
+    return records
+
+
 def parse_cargo_toml(path: Path):
-    """Extract dependencies from [dependencies] section in Cargo.toml."""
-    content = path.read_text(encoding="utf-8")
+    """Extract (name, version) pairs of all dependencies in Cargo.toml."""
+    return parse_cargo_toml_text(path.read_text(encoding="utf-8"))
+
 
+def parse_cargo_toml_text(content: str):
+    """Same as parse_cargo_toml, for Cargo.toml content given as a string."""
+    return _pairs(parse_manifest(content))
+
+
+def _parse_regex(content: str):
+    """
+    Old Stage 2 parser: only the first [dependencies] block.
+    Kept for comparison (bench.py toml), not used for parsing.
+    """
     match = re.search(r"\[dependencies\]([\s\S]*?)(\n\[|$)", content)
     if not match:
         return []
@@ -57,8 +232,215 @@ def parse_cargo_toml(path: Path):
     return dependencies
 
 
-def load_dependencies(repository_url: str, use_test_repo: bool, test_file: str = None):
-    """Load direct dependencies from a test file or a real repository."""
+# -------------------------
+# WORKSPACES
+# -------------------------
+
+def _glob_match(directory: str, pattern: str) -> bool:
+    """Match a directory against a Cargo member glob, segment by segment."""
+    dir_parts = PurePosixPath(directory).parts
+    pat_parts = PurePosixPath(pattern).parts
+    return (len(dir_parts) == len(pat_parts)
+            and all(fnmatch.fnmatchcase(d, p) for d, p in zip(dir_parts, pat_parts)))
+
+
+def expand_members(workspace: dict, manifest_dirs):
+    """
+    Return member directories of a [workspace] table, in the order of
+    the `members` list, given all directories containing a Cargo.toml.
+    """
+    exclude = workspace.get("exclude", [])
+    members = []
+    seen = set()
+    for pattern in workspace.get("members", []):
+        pattern = pattern.rstrip("/")
+        for directory in sorted(manifest_dirs):
+            if directory in seen or not _glob_match(directory, pattern):
+                continue
+            if any(_glob_match(directory, ex.rstrip("/")) for ex in exclude):
+                continue
+            seen.add(directory)
+            members.append(directory)
+    return members
+
+
+def _inherit(dep: Dependency, workspace_deps: dict) -> Dependency:
+    """Resolve a `workspace = true` dependency from [workspace.dependencies]."""
+    base = workspace_deps.get(dep.name)
+    if base is None:
+        raise ValueError("{} uses workspace = true but is not in "
+                         "[workspace.dependencies]".format(dep.name))
+    features = base.features + tuple(f for f in dep.features if f not in base.features)
+    return base._replace(kind=dep.kind, target=dep.target,
+                         optional=dep.optional, features=features)
+
+
+def parse_workspace(read_text, list_manifest_dirs, max_workers: int = 8, manifests=None):
+    """
+    Parse a repository root manifest and, if it is a workspace, all of
+    its member manifests in parallel.
+
+    - read_text: function(relative path) -> file content
+    - list_manifest_dirs: function() -> directories ("" for the root)
+      holding a Cargo.toml; only called for workspaces
+
+    Returns {"ROOT": [(name, version, kind)], member: [...], ...} with
+    kind "normal", "dev" or "build". Member crates are ROOT's
+    dependencies, so they become graph nodes.
+    A manifests dict is filled with {crate: path of its Cargo.toml}.
+    """
+    if manifests is None:
+        manifests = {}
+    manifests["ROOT"] = "Cargo.toml"
+    root = _load_toml(read_text("Cargo.toml"))
+    workspace = root.get("workspace")
+    if workspace is None:
+        return {"ROOT": _entries(_manifest_records(root))}
+
+    workspace_deps = {
+        name: _make_dependency(name, spec, "normal", None)
+        for name, spec in workspace.get("dependencies", {}).items()
+    }
+
+    def inherited(data):
+        return [_inherit(d, workspace_deps) if d.workspace else d
+                for d in _manifest_records(data)]
+
+    def load_member(directory):
+        if directory == "":
+            data = root
+        else:
+            data = _load_toml(read_text(directory + "/Cargo.toml"))
+        records = inherited(data)
+        package = data.get("package", {})
+        version = package.get("version", "")
+        if isinstance(version, dict):
+            version = workspace.get("package", {}).get("version", "")
+        return package.get("name", directory), version, _entries(records)
+
+    member_dirs = expand_members(workspace, list_manifest_dirs())
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        members = list(pool.map(load_member, member_dirs))
+
+    graph = {"ROOT": []}
+    if "package" in root and "" not in member_dirs:
+        graph["ROOT"].extend(_entries(inherited(root)))
+    for directory, (name, version, deps) in zip(member_dirs, members):
+        graph["ROOT"].append((name, version, "normal"))
+        graph[name] = deps
+        manifests[name] = directory + "/Cargo.toml" if directory else "Cargo.toml"
+    return graph
+
+
+def _pairs(records):
+    """Records -> unique (crate, version) pairs, first occurrence wins."""
+    seen = set()
+    pairs = []
+    for dep in records:
+        if dep.crate not in seen:
+            seen.add(dep.crate)
+            pairs.append((dep.crate, dep.req))
+    return pairs
+
+
+def _entries(records):
+    """
+    Records -> unique (crate, version, kind) entries, first occurrence
+    wins; a crate that is also a normal dependency is kept as one.
+    """
+    entries = {}
+    for dep in records:
+        old = entries.get(dep.crate)
+        if old is None:
+            entries[dep.crate] = (dep.crate, dep.req, dep.kind)
+        elif dep.kind == "normal" and old[2] != "normal":
+            entries[dep.crate] = old[:2] + ("normal",)
+    return list(entries.values())
+
+
+def expand_sparse_checkout(repo_dir: Path):
+    """Widen a /Cargo.toml sparse checkout to every Cargo.toml in the tree."""
+    try:
+        _git(["sparse-checkout", "set", "--no-cone", "Cargo.toml"], cwd=repo_dir)
+    except subprocess.CalledProcessError:
+        pass
+
+
+def _manifest_dir(rel_path: str) -> str:
+    """"crates/a/Cargo.toml" -> "crates/a", "Cargo.toml" -> ""."""
+    parent = PurePosixPath(rel_path).parent.as_posix()
+    return "" if parent == "." else parent
+
+
+def load_dependency_graph(repository_url: str, cache=None, mirrors=None,
+                          max_workers: int = 8, manifests=None):
+    """
+    Load the dependency lists of a repository: the root crate or, for a
+    Cargo workspace, every member crate, from a single clone or mirror.
+
+    Returns {"ROOT": [(name, version, kind)], member: [...], ...} (see
+    parse_workspace); manifests (a dict) is filled with
+    {crate: path of its Cargo.toml}.
+    """
+    if manifests is None:
+        manifests = {}
+    commit = None
+    if cache is not None:
+        commit = resolve_head(repository_url)
+        cached = cache.get(repository_url, commit, manifests)
+        if cached is not None:
+            return cached
+
+    if mirrors is not None:
+        # Read at a fixed commit: another process may fetch meanwhile
+        parsed = mirrors.head_commit(repository_url)
+        graph = parse_workspace(
+            lambda rel: mirrors.read_file(repository_url, rel, parsed),
+            lambda: [_manifest_dir(f) for f in mirrors.list_files(repository_url, parsed)
+                     if PurePosixPath(f).name == "Cargo.toml"],
+            max_workers,
+            manifests
+        )
+    else:
+        repo_dir = clone_repository(repository_url)
+
+        def list_manifest_dirs():
+            expand_sparse_checkout(repo_dir)
+            return [_manifest_dir(toml.relative_to(repo_dir).as_posix())
+                    for toml in repo_dir.rglob("Cargo.toml")
+                    if ".git" not in toml.relative_to(repo_dir).parts]
+
+        try:
+            find_cargo_files(repo_dir)
+            parsed = None
+            if cache is not None:
+                parsed = _git(["rev-parse", "HEAD"], cwd=repo_dir).stdout.decode().strip()
+            graph = parse_workspace(
+                lambda rel: (repo_dir / rel).read_text(encoding="utf-8"),
+                list_manifest_dirs,
+                max_workers,
+                manifests
+            )
+        finally:
+            shutil.rmtree(repo_dir, ignore_errors=True)
+
+    if cache is not None:
+        # Keyed by the commit that was parsed: HEAD may have moved since
+        # ls-remote, and the newer commit must not be cached as the old
+        cache.put(repository_url, parsed, graph, manifests)
+    return graph
+
+
+def load_dependencies(repository_url: str, use_test_repo: bool, test_file: str = None,
+                      cache=None, mirrors=None):
+    """
+    Load direct dependencies from a test file or a real repository.
+
+    If a ManifestCache is given, the repository HEAD is resolved first
+    and the clone is skipped when that commit is already cached.
+    If a MirrorPool is given, Cargo.toml is read from a persistent bare
+    mirror instead of a temporary clone.
+    """
     if use_test_repo:
         if test_file is None:
             raise ValueError("Test mode enabled but no test file provided.")
@@ -73,9 +455,5 @@ def load_dependencies(repository_url: str, use_test_repo: bool, test_file: str =
         return deps
 
     # Real repository
-    repo_dir = clone_repository(repository_url)
-    cargo_toml = find_cargo_files(repo_dir)
-    deps = parse_cargo_toml(cargo_toml)
-
-    shutil.rmtree(repo_dir, ignore_errors=True)
-    return deps
+    graph = load_dependency_graph(repository_url, cache=cache, mirrors=mirrors)
+    return [(name, version) for name, version, *_ in graph["ROOT"]]
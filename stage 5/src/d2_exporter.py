@@ -1,37 +1,129 @@
-from pathlib import Path
-
-def export_to_d2(edges, output_path):
-    lines = []
-    for src, dst in edges:
-        lines.append(f"{src}: {dst}")
-    content = "\n".join(lines)
-    p = Path(output_path)
-    p.write_text(content, encoding="utf-8")
-    return p
 """
 d2_exporter.py - Stage 5 (Variant 27)
 
 Exports the dependency graph to D2 format.
+
+Every node is declared once and every edge is written once as
+`A -> B`; names that are not plain identifiers (crate names with
+`-`, `.`, `@` ...) are quoted. Nodes can be grouped into containers
+by BFS depth or by crate namespace, and dev / build dependency edges
+get their own style.
+
+D2Writer is one of the writers of the shared streaming edge interface
+(edge_stream), so a generator straight from the BFS is never held in
+memory as a list. The seen nodes and edges still are, so memory is
+O(V + E), not constant. The output
+can be compressed with gzip (standard library) or zstd (optional
+`zstandard` package), picked by argument or file suffix.
 """
 
+import re
 from pathlib import Path
 
-def export_to_d2(edges, output_path):
+from edge_stream import TextWriter, export_edges, CHUNK_LINES, COMPRESSIONS
+
+
+GROUP_BY = (None, "depth", "namespace")
+
+EDGE_STYLES = {
+    "dev": "{style.stroke-dash: 3}",
+    "build": '{style.stroke-dash: 6; style.stroke: "#888888"}',
+}
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# Keys D2 would read as attributes instead of shapes
+_RESERVED = {
+    "label", "shape", "style", "icon", "width", "height", "near",
+    "tooltip", "link", "direction", "constraint", "class", "classes",
+    "vars", "top", "left", "source-arrowhead", "target-arrowhead",
+    "grid-rows", "grid-columns", "grid-gap", "null",
+}
+
+
+def d2_key(name) -> str:
+    """Node name as a D2 key, quoted and escaped unless it is a plain identifier."""
+    name = str(name)
+    if _IDENTIFIER.fullmatch(name) and name.lower() not in _RESERVED:
+        return name
+    escaped = name.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def crate_namespace(name) -> str:
+    """Namespace of a crate: `tokio-util` -> `tokio`, `serde_json@1.0.0` -> `serde`."""
+    name = str(name).split("@", 1)[0]
+    return re.split(r"[-_]", name, 1)[0] or name
+
+
+class D2Writer(TextWriter):
     """
-    edges: list of (src, dst)
-    output_path: path to .d2 file
+    D2 lines for the edge stream.
 
-    Writes D2 diagram format like:
-    A: B
-    B: C
+    group_by: None, "depth" (BFS depth, the first time a node is seen:
+    sources never seen before are depth 0) or "namespace"
+    edge_kind: optional function(src, dst) -> "normal" / "dev" / "build"
     """
-    lines = []
-    for src, dst in edges:
-        lines.append(f"{src}: {dst}")
 
-    content = "\n".join(lines)
+    suffix = ".d2"
+
+    def __init__(self, group_by=None, edge_kind=None):
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Unknown grouping: {group_by!r} (expected one of {GROUP_BY})")
+        self.group_by = group_by
+        self.edge_kind = edge_kind
+        self.paths = {}       # name -> D2 path
+        self.depths = {}
+        self.containers = set()
+
+    def node_lines(self, name, parent):
+        """Declaration lines of a new node (and of its container)."""
+        depth = self.depths[name] = self.depths[parent] + 1 if parent is not None else 0
+        if self.group_by == "depth":
+            container = f"depth{depth}"
+            label = f"depth {depth}"
+        elif self.group_by == "namespace":
+            container = d2_key(crate_namespace(name))
+            label = None
+        else:
+            self.paths[name] = path = d2_key(name)
+            return [path]
+
+        lines = []
+        if container not in self.containers:
+            self.containers.add(container)
+            lines.append(f"{container}: {d2_key(label)}" if label else container)
+        self.paths[name] = path = f"{container}.{d2_key(name)}"
+        lines.append(path)
+        return lines
+
+    def edge_lines(self, src, dst):
+        line = f"{self.paths[src]} -> {self.paths[dst]}"
+        style = EDGE_STYLES.get(self.edge_kind(src, dst)) if self.edge_kind else None
+        return [f"{line}: {style}" if style else line]
+
 
-    p = Path(output_path)
-    p.write_text(content, encoding="utf-8")
+def d2_lines(edges, group_by=None, edge_kind=None):
+    """Yield the D2 lines for (src, dst) pairs."""
+    return D2Writer(group_by, edge_kind).lines(edges)
 
-    return p
+
+def export_to_d2(edges, output_path, compression=None, chunk_lines=CHUNK_LINES,
+                 group_by=None, edge_kind=None):
+    """
+    edges: graph.Graph, list or any iterable of (src, dst)
+    output_path: path to .d2 file (.d2.gz / .d2.zst to compress)
+    compression: None, "gzip" or "zstd"; by default taken from the suffix
+    group_by / edge_kind: see D2Writer
+
+    Writes D2 diagram format like:
+    A
+    B
+    A -> B
+    C
+    B -> C
+
+    Returns (path, number of distinct edges written).
+    """
+    writer = D2Writer(group_by, edge_kind)
+    stream = export_edges(edges, [(writer, output_path)], compression, chunk_lines)
+    return Path(output_path), len(stream.edges)
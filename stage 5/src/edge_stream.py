@@ -0,0 +1,192 @@
+"""
+edge_stream.py - Stage 5 (Variant 27)
+
+Streaming edge interface shared by the exporters (d2_exporter,
+exporters, binary_graph).
+
+EdgeStream reads (src, dst) pairs once and turns them into events:
+- ("node", name, parent) the first time a crate is seen (parent is
+  the source of the edge that introduced it, None for a source)
+- ("edge", src, dst) the first time an edge is seen
+
+Writers implement start(out, chunk_lines), node(name, parent),
+edge(src, dst) and finish(); export_edges feeds the same events to
+every writer, so several formats are written in one pass over a BFS
+generator. Nodes are numbered in the order they are first seen
+(EdgeStream.ids), and repeated edges are counted and dropped with a
+set of id pairs.
+
+Streaming keeps the edge list and the output lines out of memory, but
+it is not constant memory: the interned names and the seen-edge set
+grow with the graph, O(V + E).
+"""
+
+import gzip
+from contextlib import ExitStack
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+NODE = "node"
+EDGE = "edge"
+CHUNK_LINES = 4096
+COMPRESSIONS = (None, "gzip", "zstd")
+SUFFIX_COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+
+class EdgeStream:
+    """
+    Interns crate names and drops repeated edges while streaming.
+    Holds every name and one id pair per distinct edge: O(V + E).
+    """
+
+    def __init__(self):
+        self.ids = {}         # name -> id, in order of first appearance
+        self.names = []
+        self.edges = set()    # (src id, dst id)
+        self.duplicates = 0
+
+    def _intern(self, name):
+        self.ids[name] = len(self.names)
+        self.names.append(name)
+
+    def events(self, edges):
+        """Yield node / edge events for (src, dst) pairs."""
+        ids = self.ids
+        for src, dst in edges:
+            if src not in ids:
+                self._intern(src)
+                yield NODE, src, None
+            if dst not in ids:
+                self._intern(dst)
+                yield NODE, dst, src
+
+            key = (ids[src], ids[dst])
+            if key in self.edges:
+                self.duplicates += 1
+                continue
+            self.edges.add(key)
+            yield EDGE, src, dst
+
+
+def open_output(path, compression=None, binary=False):
+    """Open an export file for writing, gzip / zstd compressed if asked."""
+    path = Path(path)
+    if binary:
+        if compression is not None:
+            raise ValueError("Binary exports cannot be compressed (they are memory-mapped).")
+        return path.open("wb")
+    if compression is None:
+        return path.open("w", encoding="utf-8", newline="\n")
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8", newline="\n")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd output needs the 'zstandard' package "
+                               "(pip install zstandard).")
+        return zstandard.open(path, "wt", encoding="utf-8", newline="\n")
+    raise ValueError(f"Unknown compression: {compression!r} "
+                     f"(expected one of {COMPRESSIONS})")
+
+
+class LineWriter:
+    """
+    Buffered text output: lines are joined with newlines and written
+    in chunks of chunk_lines.
+    """
+
+    def __init__(self, out, chunk_lines: int = CHUNK_LINES):
+        self.out = out
+        self.chunk_lines = chunk_lines
+        self.chunk = []
+        self.first = True
+
+    def write(self, lines):
+        self.chunk.extend(lines)
+        if len(self.chunk) >= self.chunk_lines:
+            self.flush()
+
+    def flush(self):
+        if not self.chunk:
+            return
+        self.out.write(("" if self.first else "\n") + "\n".join(self.chunk))
+        self.first = False
+        self.chunk.clear()
+
+
+class TextWriter:
+    """
+    Base class of the text formats: subclasses return lines from
+    header(), node_lines(name, parent), edge_lines(src, dst) and footer().
+    """
+
+    binary = False
+
+    def header(self):
+        return ()
+
+    def node_lines(self, name, parent):
+        return ()
+
+    def edge_lines(self, src, dst):
+        return ()
+
+    def footer(self):
+        return ()
+
+    def start(self, out, chunk_lines: int = CHUNK_LINES):
+        self._lines = LineWriter(out, chunk_lines)
+        self._lines.write(self.header())
+
+    def node(self, name, parent):
+        self._lines.write(self.node_lines(name, parent))
+
+    def edge(self, src, dst):
+        self._lines.write(self.edge_lines(src, dst))
+
+    def finish(self):
+        self._lines.write(self.footer())
+        self._lines.flush()
+
+    def lines(self, edges):
+        """All lines for (src, dst) pairs, without a file."""
+        yield from self.header()
+        for kind, a, b in EdgeStream().events(edges):
+            if kind == NODE:
+                yield from self.node_lines(a, b)
+            else:
+                yield from self.edge_lines(a, b)
+        yield from self.footer()
+
+
+def export_edges(edges, outputs, compression=None, chunk_lines: int = CHUNK_LINES):
+    """
+    Write edges to every (writer, path) in outputs in a single pass.
+
+    compression: None, "gzip" or "zstd" for the text formats; by default
+    taken from each path's suffix (.gz / .zst).
+    Returns the EdgeStream (ids, names, distinct edges, duplicates).
+    """
+    stream = EdgeStream()
+    writers = [writer for writer, _ in outputs]
+    with ExitStack() as stack:
+        for writer, path in outputs:
+            path = Path(path)
+            mode = None if writer.binary else (compression or SUFFIX_COMPRESSIONS.get(path.suffix))
+            writer.start(stack.enter_context(open_output(path, mode, writer.binary)), chunk_lines)
+
+        for kind, a, b in stream.events(edges):
+            if kind == NODE:
+                for writer in writers:
+                    writer.node(a, b)
+            else:
+                for writer in writers:
+                    writer.edge(a, b)
+
+        for writer in writers:
+            writer.finish()
+    return stream
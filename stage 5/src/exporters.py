@@ -0,0 +1,135 @@
+"""
+exporters.py - Stage 5 (Variant 27)
+
+Export formats besides D2, all writers of the shared streaming edge
+interface in edge_stream, so any of them (or several at once) can be
+written in one pass over a BFS generator:
+- d2: D2 diagram (d2_exporter)
+- dot: Graphviz DOT
+- graphml: GraphML XML
+- jsonl: JSON Lines, one {"src", "dst"} object per edge
+- bin: memory-mappable binary format (binary_graph)
+"""
+
+import json
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from binary_graph import BinaryWriter
+from d2_exporter import D2Writer
+from edge_stream import TextWriter, export_edges, CHUNK_LINES
+
+
+DOT_STYLES = {
+    "dev": "style=dotted",
+    "build": "style=dashed, color=gray50",
+}
+
+
+def dot_id(name) -> str:
+    """Quoted DOT identifier."""
+    escaped = str(name).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+class DotWriter(TextWriter):
+    """Graphviz digraph, one statement per node and edge."""
+
+    suffix = ".dot"
+
+    def __init__(self, edge_kind=None, name: str = "dependencies"):
+        self.edge_kind = edge_kind
+        self.name = name
+
+    def header(self):
+        return [f"digraph {dot_id(self.name)} {{"]
+
+    def node_lines(self, name, parent):
+        return [f"  {dot_id(name)};"]
+
+    def edge_lines(self, src, dst):
+        line = f"  {dot_id(src)} -> {dot_id(dst)}"
+        style = DOT_STYLES.get(self.edge_kind(src, dst)) if self.edge_kind else None
+        return [f"{line} [{style}];" if style else f"{line};"]
+
+    def footer(self):
+        return ["}"]
+
+
+class GraphMLWriter(TextWriter):
+    """GraphML with node ids n0, n1, ... and the crate name as "name" data."""
+
+    suffix = ".graphml"
+
+    def __init__(self, edge_kind=None):
+        self.edge_kind = edge_kind
+        self.ids = {}
+
+    def header(self):
+        return [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">',
+            '  <key id="name" for="node" attr.name="name" attr.type="string"/>',
+            '  <key id="kind" for="edge" attr.name="kind" attr.type="string"/>',
+            '  <graph id="dependencies" edgedefault="directed">',
+        ]
+
+    def node_lines(self, name, parent):
+        node_id = self.ids[name] = f"n{len(self.ids)}"
+        return [f'    <node id="{node_id}"><data key="name">{escape(str(name))}</data></node>']
+
+    def edge_lines(self, src, dst):
+        line = f'    <edge source="{self.ids[src]}" target="{self.ids[dst]}"'
+        if self.edge_kind:
+            return [f'{line}><data key="kind">{escape(self.edge_kind(src, dst))}</data></edge>']
+        return [f"{line}/>"]
+
+    def footer(self):
+        return ["  </graph>", "</graphml>"]
+
+
+class JsonLinesWriter(TextWriter):
+    """One JSON object per edge: {"src": ..., "dst": ...[, "kind": ...]}."""
+
+    suffix = ".jsonl"
+
+    def __init__(self, edge_kind=None):
+        self.edge_kind = edge_kind
+
+    def edge_lines(self, src, dst):
+        record = {"src": src, "dst": dst}
+        if self.edge_kind:
+            record["kind"] = self.edge_kind(src, dst)
+        return [json.dumps(record, ensure_ascii=False)]
+
+
+FORMATS = {
+    "d2": D2Writer,
+    "dot": DotWriter,
+    "graphml": GraphMLWriter,
+    "jsonl": JsonLinesWriter,
+    "bin": BinaryWriter,
+}
+
+
+def make_writer(fmt: str, group_by=None, edge_kind=None):
+    """New writer for a format name (group_by only applies to D2)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r} (expected one of {tuple(FORMATS)})")
+    if fmt == "d2":
+        return D2Writer(group_by, edge_kind)
+    if fmt == "bin":
+        return BinaryWriter()
+    return FORMATS[fmt](edge_kind=edge_kind)
+
+
+def export_graph(edges, outputs, compression=None, chunk_lines=CHUNK_LINES,
+                 group_by=None, edge_kind=None):
+    """
+    Write edges in every format of outputs ({format: path}) in one pass.
+    Text formats are compressed like export_to_d2; "bin" never is.
+    Returns (list of written paths, number of distinct edges).
+    """
+    pairs = [(make_writer(fmt, group_by, edge_kind), path) for fmt, path in outputs.items()]
+    stream = export_edges(edges, pairs, compression, chunk_lines)
+    return [Path(path) for path in outputs.values()], len(stream.edges)
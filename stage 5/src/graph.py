@@ -0,0 +1,175 @@
+"""
+graph.py - Stage 5 (Variant 27)
+
+Compact dependency graph shared by BFS, topological sort and export.
+
+Node names are interned to ints once. Adjacency is stored in CSR form:
+two array('i') buffers, `offsets` (one entry per node + 1) and
+`targets` (one entry per edge), instead of a list of string tuples.
+"""
+
+from array import array
+
+
+class Graph:
+    """
+    Directed graph with integer node ids.
+
+    Iterating over a Graph yields (source, target) name pairs in the
+    stored order, so it can be used wherever an edge list was used.
+    """
+
+    def __init__(self, names, offsets, targets):
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_edges(cls, edges, nodes=()):
+        """
+        Build a graph from (source, target) pairs.
+
+        Node ids follow the order of first appearance; edges are grouped
+        by source with their relative order kept (a stable counting
+        sort), so BFS output keeps its exact edge order.
+        """
+        ids = {}
+        names = []
+
+        def intern(name):
+            i = ids.get(name)
+            if i is None:
+                i = ids[name] = len(names)
+                names.append(name)
+            return i
+
+        for name in nodes:
+            intern(name)
+
+        srcs = array("i")
+        dsts = array("i")
+        add_src = srcs.append
+        add_dst = dsts.append
+        for src, dst in edges:
+            s = ids.get(src)
+            add_src(intern(src) if s is None else s)
+            d = ids.get(dst)
+            add_dst(intern(dst) if d is None else d)
+
+        return cls.from_ids(names, srcs, dsts)
+
+    @classmethod
+    def from_ids(cls, names, srcs, dsts):
+        """
+        Build a graph from parallel arrays of source / target ids
+        (indexes into names), e.g. the edge arrays of a binary export.
+        """
+        n = len(names)
+        offsets = array("i", [0]) * (n + 1)
+        for s in srcs:
+            offsets[s + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+
+        fill = array("i", offsets)
+        targets = array("i", [0]) * len(dsts)
+        for s, d in zip(srcs, dsts):
+            targets[fill[s]] = d
+            fill[s] += 1
+
+        return cls(names, offsets, targets)
+
+    @classmethod
+    def from_adjacency(cls, adjacency: dict):
+        """Build a graph from {"A": ["B", "C"], ...}."""
+        return cls.from_edges(
+            ((src, dst) for src, deps in adjacency.items() for dst in deps),
+            nodes=adjacency.keys()
+        )
+
+    # -------------------------
+    # SIZE / LOOKUP
+    # -------------------------
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.names)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.targets)
+
+    def __len__(self):
+        return self.num_edges
+
+    def node_id(self, name) -> int:
+        return self.ids[name]
+
+    def successors(self, i: int):
+        """Target ids of node i (a slice of the targets buffer)."""
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def get(self, name, default=None):
+        """dict-style lookup of successor names, used by build_bfs_graph."""
+        i = self.ids.get(name)
+        if i is None:
+            return default
+        return [self.names[t] for t in self.successors(i)]
+
+    # -------------------------
+    # DEGREES
+    # -------------------------
+
+    def out_degree(self) -> array:
+        off = self.offsets
+        return array("i", (off[i + 1] - off[i] for i in range(self.num_nodes)))
+
+    def in_degree(self) -> array:
+        deg = array("i", [0]) * self.num_nodes
+        for t in self.targets:
+            deg[t] += 1
+        return deg
+
+    def reversed(self) -> "Graph":
+        """Same nodes (same ids), every edge flipped."""
+        n = self.num_nodes
+        offsets = array("i", [0]) * (n + 1)
+        for t in self.targets:
+            offsets[t + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+
+        fill = array("i", offsets)
+        targets = array("i", [0]) * self.num_edges
+        for s, t in self.edge_ids():
+            targets[fill[t]] = s
+            fill[t] += 1
+
+        rev = Graph.__new__(Graph)
+        rev.names = self.names
+        rev.ids = self.ids
+        rev.offsets = offsets
+        rev.targets = targets
+        return rev
+
+    # -------------------------
+    # ITERATION
+    # -------------------------
+
+    def edge_ids(self):
+        """Yield (source id, target id) pairs."""
+        off = self.offsets
+        targets = self.targets
+        for s in range(self.num_nodes):
+            for k in range(off[s], off[s + 1]):
+                yield s, targets[k]
+
+    def __iter__(self):
+        names = self.names
+        off = self.offsets
+        targets = self.targets
+        for s in range(self.num_nodes):
+            src = names[s]
+            for t in targets[off[s]:off[s + 1]]:
+                yield src, names[t]
@@ -7,15 +7,28 @@ Supports:
 - cycle detection
 - substring filtering
 - test mode (graph described in a simple text file)
+- concurrent BFS (one frontier level at a time on a thread pool)
+- indexed test graphs (lines read lazily from a memory-mapped file)
+- streaming (iter_* versions yield edges as they are found)
+- binary test graphs (binary_graph export format)
 """
 
+import hashlib
+import mmap
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from binary_graph import BinaryGraph, is_binary_graph
+
+
+DEFAULT_MAX_WORKERS = 8
+
 
 def load_test_graph(path: str):
     """
-    Loads a simple A: B C style graph from a file.
+    Loads a simple A: B C style graph (or a binary graph export)
+    from a file.
     Returns a dict: {"A": ["B", "C"], ...}
     """
     graph = {}
@@ -23,6 +36,12 @@ def load_test_graph(path: str):
     if not p.exists():
         raise FileNotFoundError("Test graph file not found.")
 
+    if is_binary_graph(p):
+        with BinaryGraph(p) as binary:
+            for src, dst in binary:
+                graph.setdefault(src, []).append(dst)
+        return graph
+
     for line in p.read_text().splitlines():
         if ":" not in line:
             continue
@@ -34,6 +53,82 @@ def load_test_graph(path: str):
     return graph
 
 
+class IndexedTestGraph:
+    """
+    Lazy version of load_test_graph for very large A: B C files.
+
+    One pass over the file records the byte offset of every "A:" line
+    (as with load_test_graph, a later line for the same node wins).
+    get(node) then parses only that line from a memory map, so a BFS
+    with a small max_depth only reads the lines it reaches.
+    """
+
+    def __init__(self, path: str):
+        p = Path(path)
+        if not p.exists():
+            raise FileNotFoundError("Test graph file not found.")
+
+        self._file = p.open("rb")
+        self.offsets = {}
+        offset = 0
+        for line in self._file:
+            colon = line.find(b":")
+            if colon != -1:
+                self.offsets[line[:colon].strip().decode()] = offset + colon + 1
+            offset += len(line)
+
+        self._map = None
+        if offset:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, node, default=None):
+        start = self.offsets.get(node)
+        if start is None:
+            return default
+        end = self._map.find(b"\n", start)
+        if end == -1:
+            end = len(self._map)
+        return self._map[start:end].decode().split()
+
+    def fingerprint(self, node) -> str:
+        """Change stamp for incremental rebuilds: hash of the node's line."""
+        start = self.offsets.get(node)
+        if start is None:
+            return "missing"
+        end = self._map.find(b"\n", start)
+        if end == -1:
+            end = len(self._map)
+        return hashlib.sha256(self._map[start:end]).hexdigest()[:16]
+
+    def __contains__(self, node):
+        return node in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_test_graph(path: str):
+    """
+    IndexedTestGraph for an A: B C file, BinaryGraph for a binary
+    export; both are context managers with get(node, default).
+    """
+    p = Path(path)
+    if p.exists() and is_binary_graph(p):
+        return BinaryGraph(p)
+    return IndexedTestGraph(path)
+
+
 def build_bfs_graph(root: str, dependency_loader, max_depth: int,
                     filter_substring: str, test_graph: dict = None):
     """
@@ -44,14 +139,25 @@ def build_bfs_graph(root: str, dependency_loader, max_depth: int,
     - dependency_loader: function(name) -> list of dependency names
     - max_depth: maximum BFS depth
     - filter_substring: exclude dependencies containing this substring
-    - test_graph: optional dict used in test mode
+    - test_graph: optional dict (or graph.Graph / IndexedTestGraph)
+      used in test mode
 
     Returns:
     - edges: list of (source, target)
     """
+    return list(iter_bfs_graph(root, dependency_loader, max_depth,
+                               filter_substring, test_graph))
+
+
+def iter_bfs_graph(root: str, dependency_loader, max_depth: int,
+                   filter_substring: str, test_graph: dict = None):
+    """
+    Generator version of build_bfs_graph: yields (source, target) edges
+    as they are found, so they can be written out without keeping the
+    edge list in memory.
+    """
     visited = set()
     queue = deque([(root, 0)])
-    edges = []
 
     while queue:
         current, depth = queue.popleft()
@@ -75,9 +181,63 @@ def build_bfs_graph(root: str, dependency_loader, max_depth: int,
             if filter_substring and filter_substring in dep:
                 continue
 
-            edges.append((current, dep))
+            yield current, dep
 
             if dep not in visited:
                 queue.append((dep, depth + 1))
 
-    return edges
+
+def build_bfs_graph_concurrent(root: str, dependency_loader, max_depth: int,
+                               filter_substring: str, test_graph: dict = None,
+                               max_workers: int = DEFAULT_MAX_WORKERS):
+    """
+    Builds the same graph as build_bfs_graph, but loads a whole
+    BFS level at once on a pool of at most max_workers threads.
+
+    Levels are processed one after another and results are consumed
+    in frontier order, so the edge order, depth limit and filtering
+    are exactly the same as in the serial version.
+    """
+    return list(iter_bfs_graph_concurrent(root, dependency_loader, max_depth,
+                                          filter_substring, test_graph, max_workers))
+
+
+def iter_bfs_graph_concurrent(root: str, dependency_loader, max_depth: int,
+                              filter_substring: str, test_graph: dict = None,
+                              max_workers: int = DEFAULT_MAX_WORKERS):
+    """Generator version of build_bfs_graph_concurrent."""
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+
+    if test_graph is not None:
+        def load(name):
+            return test_graph.get(name, [])
+    else:
+        load = dependency_loader
+
+    visited = set()
+    frontier = [root]
+    depth = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while frontier and depth < max_depth:
+            # Keep first occurrence only, skip nodes seen on earlier levels
+            level = []
+            for node in frontier:
+                if node not in visited:
+                    visited.add(node)
+                    level.append(node)
+
+            next_frontier = []
+            for current, deps in zip(level, pool.map(load, level)):
+                for dep in deps:
+                    if filter_substring and filter_substring in dep:
+                        continue
+
+                    yield current, dep
+
+                    if dep not in visited:
+                        next_frontier.append(dep)
+
+            frontier = next_frontier
+            depth += 1
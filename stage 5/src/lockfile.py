@@ -0,0 +1,163 @@
+"""
+lockfile.py - Stage 5 (Variant 27)
+
+Offline dependency source built from Cargo.lock.
+
+Cargo.lock already contains the fully resolved transitive graph, so
+the whole graph is available without any clone or network access.
+Supports lockfile versions 1 to 4.
+"""
+
+import hashlib
+from collections import Counter
+from pathlib import Path
+
+
+def _value(line: str) -> str:
+    """'name = "serde"' -> 'serde'"""
+    return line.split("=", 1)[1].strip().strip('"')
+
+
+def iter_packages(path):
+    """
+    Stream [[package]] entries of a Cargo.lock as dicts with keys
+    name, version, source, checksum and dependencies (list of raw
+    strings).
+    Only one entry is held in memory at a time.
+    """
+    package = None
+    in_deps = False
+
+    with Path(path).open("r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            if in_deps:
+                if line.startswith("]"):
+                    in_deps = False
+                else:
+                    package["dependencies"].append(line.rstrip(",").strip('"'))
+                continue
+
+            if line.startswith("["):
+                if package is not None:
+                    yield package
+                package = None
+                if line == "[[package]]":
+                    package = {"name": None, "version": None, "source": None,
+                               "checksum": None, "dependencies": []}
+                continue
+
+            if package is None:
+                continue
+
+            key = line.split("=", 1)[0].strip()
+            if key in ("name", "version", "source", "checksum"):
+                package[key] = _value(line)
+            elif key == "dependencies":
+                rest = line.split("=", 1)[1].strip()
+                if rest.endswith("]"):
+                    # One-line array: dependencies = ["a", "b 1.0"]
+                    items = rest.strip("[]").split(",")
+                    package["dependencies"].extend(
+                        i.strip().strip('"') for i in items if i.strip())
+                else:
+                    in_deps = True
+
+    if package is not None:
+        yield package
+
+
+def _parse_dep_ref(ref: str):
+    """
+    'name' (v2+), 'name version' or 'name version (source)' (v1)
+    -> (name, version or None, source or None)
+    """
+    source = None
+    if "(" in ref:
+        ref, source = ref.split("(", 1)
+        source = source.rstrip(")")
+    parts = ref.split()
+    return parts[0], (parts[1] if len(parts) > 1 else None), source
+
+
+def _stamp(pkg, deps) -> str:
+    """
+    Name, version and checksum of a [[package]] entry plus the node
+    names its dependencies resolved to: those change when a second
+    version of a dependency gets locked ("libc" -> "libc@0.2.1"), and
+    packages without a checksum (workspace and path crates) can change
+    their dependencies under the same version.
+    """
+    digest = hashlib.sha256("\n".join(deps).encode()).hexdigest()[:16]
+    return "{} {} {} {}".format(pkg["name"], pkg["version"], pkg["checksum"] or "-", digest)
+
+
+class LockfileIndex:
+    """
+    Adjacency index over a Cargo.lock, built in one pass.
+
+    Node names are crate names; when several versions of one crate are
+    locked, every version becomes its own node "name@version", and when
+    one version is locked from several sources (registry and git), the
+    source is added: "name@version (source)".
+    """
+
+    def __init__(self, path):
+        packages = list(iter_packages(path))
+        if not packages:
+            raise ValueError("No [[package]] entries in {}".format(path))
+
+        by_name = {}
+        for pkg in packages:
+            by_name.setdefault(pkg["name"], []).append(pkg)
+
+        self._by_name = by_name
+        self._versions = Counter((pkg["name"], pkg["version"]) for pkg in packages)
+        self.graph = {}
+        self.stamps = {}
+        for pkg in packages:
+            key = self._key(pkg)
+            self.graph[key] = [self._key(self._lookup(ref)) for ref in pkg["dependencies"]]
+            self.stamps[key] = _stamp(pkg, self.graph[key])
+
+    def _key(self, pkg) -> str:
+        if len(self._by_name[pkg["name"]]) == 1:
+            return pkg["name"]
+        if self._versions[pkg["name"], pkg["version"]] == 1:
+            return "{}@{}".format(pkg["name"], pkg["version"])
+        return "{}@{} ({})".format(pkg["name"], pkg["version"], pkg["source"] or "path")
+
+    def _lookup(self, ref: str):
+        name, version, source = _parse_dep_ref(ref)
+        candidates = self._by_name.get(name)
+        if not candidates:
+            raise ValueError("Cargo.lock references unknown package: {}".format(ref))
+        if version is not None:
+            candidates = [p for p in candidates if p["version"] == version]
+        if source is not None and len(candidates) > 1:
+            candidates = [p for p in candidates if p["source"] == source]
+        if len(candidates) != 1:
+            raise ValueError("Ambiguous Cargo.lock reference: {}".format(ref))
+        return candidates[0]
+
+    def resolve(self, name: str, version: str = None) -> str:
+        """Node name of a locked package, picking version if given."""
+        candidates = self._by_name.get(name)
+        if not candidates:
+            raise KeyError("Package {} not found in Cargo.lock".format(name))
+        if version:
+            candidates = [p for p in candidates if p["version"] == version]
+            if not candidates:
+                raise KeyError("Package {} {} not found in Cargo.lock".format(name, version))
+        return self._key(candidates[0])
+
+    def fingerprint(self, name: str) -> str:
+        """Change stamp for incremental rebuilds (see _stamp)."""
+        return self.stamps.get(name, "missing")
+
+    def loader(self, name: str):
+        """dependency_loader for build_bfs_graph: O(1) per node."""
+        return self.graph.get(name, [])
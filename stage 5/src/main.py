@@ -11,14 +11,55 @@ Stages included:
 """
 
 import argparse
+import asyncio
+import hashlib
 import json
 import sys
-from pathlib import Path
-
-from cargo_parser import load_dependencies
-from graph_builder import build_bfs_graph, load_test_graph
-from topo_sort import topological_sort, compare_with_cargo
-from d2_exporter import export_to_d2
+import threading
+import time
+from functools import partial
+from pathlib import Path, PurePosixPath
+
+from cargo_parser import load_dependency_graph, FETCH_STATS
+from graph_builder import (
+    build_bfs_graph,
+    build_bfs_graph_concurrent,
+    iter_bfs_graph,
+    iter_bfs_graph_concurrent,
+    open_test_graph,
+    DEFAULT_MAX_WORKERS
+)
+from topo_sort import (
+    topological_sort,
+    patch_topological_order,
+    strongly_connected_components,
+    find_cycles,
+    build_schedule,
+    order_digest,
+    transitive_reduction,
+    TIE_BREAKS,
+    compare_with_cargo
+)
+from d2_exporter import COMPRESSIONS, GROUP_BY
+from exporters import FORMATS, export_graph
+from graph import Graph
+from manifest_cache import ManifestCache, DEFAULT_MAX_BYTES, DEFAULT_MAX_AGE, resolve_head
+from mirror_pool import MirrorPool
+from lockfile import LockfileIndex
+from cargo_order import load_cargo_order
+from reachability import ReachabilityIndex
+from renderer import (
+    Renderer,
+    BACKENDS,
+    TILE_BY,
+    DEFAULT_RENDER_CACHE,
+    DEFAULT_MAX_TILE_NODES,
+    DEFAULT_TIMEOUT
+)
+from server import GraphServer, source_stamp
+from sparse_index import SparseIndex
+from summarize import summarize, SUMMARY_MODES
+from snapshot import GraphSnapshot
 
 
 REQUIRED_FIELDS = [
@@ -58,27 +99,102 @@ def print_graph(edges):
         print(f"{src} -> {tgt}")
 
 
-def print_topological(order, ok):
+def print_topological(order, ok, components=None, cycles=None):
     print("\n=== Topological Order ===")
     for node in order:
         print(node)
     if not ok:
         print("\nWARNING: Graph contains cycles!")
+    if components:
+        print_condensed(components, cycles or [])
+
+
+def print_condensed(components, cycles):
+    """Order of strongly connected components, cycles shown as groups."""
+    print("\n=== Condensed Order (cycles grouped) ===")
+    cyclic = {tuple(comp) for comp in cycles}
+    for comp in components:
+        if tuple(comp) in cyclic:
+            print("[cycle] " + ", ".join(comp))
+        else:
+            print(comp[0])
+
+
+def print_schedule(schedule):
+    print("\n=== Build Schedule (parallel layers) ===")
+    for i, layer in enumerate(schedule["layers"]):
+        print(f"Layer {i}: {', '.join(layer)}")
+    print(f"Depth: {schedule['depth']}")
+    print(f"Critical path: {' -> '.join(schedule['critical_path'])} "
+          f"(cost {schedule['critical_path_cost']:g})")
 
 
 def print_diff(diff):
     print("\n=== Comparison With Cargo Order ===")
-    if not diff:
+    if not any(diff.values()):
         print("No differences detected.")
         return
-    for ours, cargo in diff:
-        print(f"Our: {ours}   |   Cargo: {cargo}")
+    if diff["moved"]:
+        print(f"Moved ({len(diff['moved'])}): {', '.join(diff['moved'])}")
+    for a, b in diff["violations"]:
+        print(f"Precedence violation: {a} depends on {b}, orders disagree")
+    if diff["only_ours"]:
+        print(f"Only in our order: {', '.join(diff['only_ours'])}")
+    if diff["only_cargo"]:
+        print(f"Only in Cargo order: {', '.join(diff['only_cargo'])}")
+
+
+def print_cache_stats(cache):
+    stats = cache.stats()
+    print("\n=== Manifest Cache ===")
+    print(f"Hits: {stats['hits']}   |   Misses: {stats['misses']}")
+
+
+def print_fetch_stats(stats):
+    print("\n=== Fetch Statistics ===")
+    print(f"Clones: {stats['clones']} (partial: {stats['partial']}, "
+          f"fallbacks: {stats['fallbacks']})")
+    print(f"Transferred: {stats['bytes']} bytes in {stats['seconds']} s")
+
+
+def print_render(renderer, results):
+    print(f"\n=== Render ({renderer.backend}) ===")
+    for path, cached in results:
+        print(f"{path}{'  (cached)' if cached else ''}")
+    print(f"{renderer.rendered} rendered, {renderer.hits} from cache")
+
+
+def print_incremental(snapshot, added, removed):
+    print("\n=== Incremental Rebuild ===")
+    print(f"Reused: {snapshot.reused}   |   Re-resolved: {snapshot.resolved}")
+    for src, tgt in added:
+        print(f"+ {src} -> {tgt}")
+    for src, tgt in removed:
+        print(f"- {src} -> {tgt}")
+
+
+def print_exports(paths, d2_hint=True):
+    """D2 message for the .d2 file, one line for every other format."""
+    others = []
+    for path in paths:
+        if ".d2" in path.suffixes:
+            if d2_hint:
+                print_d2_message(path)
+        else:
+            others.append(path)
+    if others:
+        print("\n=== Export ===")
+        for path in others:
+            print(f"Saved: {path}")
 
 
 def print_d2_message(path):
     print("\n=== D2 Export ===")
     print(f"D2 file saved to: {path}")
     print("To render an image, run:")
+    if path.suffix in (".gz", ".zst"):
+        print(f"  {'gzip' if path.suffix == '.gz' else 'zstd'} -dk {path}")
+        path = path.with_suffix("")
     print(f"  d2 {path} output.svg")
 
 
@@ -86,98 +202,580 @@ def print_d2_message(path):
 # DEPENDENCY LOADER (REAL MODE)
 # -------------------------
 
-def dependency_loader_factory(repo_url):
+def dependency_loader_factory(repo_url, cache=None, mirrors=None, max_workers=8,
+                              manifests=None):
     """
     Loads direct dependencies using Stage 2 logic.
-    Used only for the root package.
+    Answers the root package and, for a Cargo workspace, its member
+    crates; everything else has no known dependencies.
+    manifests: optional dict filled with {crate: Cargo.toml path} on load.
+
+    Returns (loader, edge_kind): edge_kind(src, dst) is the dependency
+    kind ("normal", "dev" or "build") of an edge the loader returned.
     """
+    graph = {}
+    kinds = {}
+    lock = threading.Lock()
+
     def loader(package_name):
-        if package_name == "ROOT":
-            deps = load_dependencies(repo_url, False)
-            return [name for name, version in deps]
-        return []
-    return loader
+        with lock:
+            if not graph:
+                graph.update(load_dependency_graph(
+                    repo_url, cache=cache, mirrors=mirrors, max_workers=max_workers,
+                    manifests=manifests))
+                # Cache entries written before kinds were kept are pairs
+                kinds.update(((src, entry[0]), entry[2])
+                             for src, deps in graph.items() for entry in deps
+                             if len(entry) > 2)
+        return [entry[0] for entry in graph.get(package_name, [])]
+
+    def edge_kind(src, dst):
+        return kinds.get((src, dst), "normal")
+    return loader, edge_kind
+
+
+def manifest_fingerprint(repo_url, mirrors, snapshot, manifests):
+    """
+    Per-node change stamp for incremental rebuilds in real mode, from
+    the blob ids of the Cargo.toml files in the mirror (tree objects
+    only, no manifest is read):
+    - a crate of the repository: "<path>@<blob id>" of its Cargo.toml
+    - ROOT: a digest of all of them, since any manifest can change
+      the workspace members
+    - anything else: "-", it has no manifest in the repository
+
+    The path of a crate comes from manifests once the graph is loaded
+    (at ROOT, whenever any manifest changed), before that from the
+    stamp stored in the snapshot.
+    """
+    listing = {}
+    lock = threading.Lock()
+
+    def manifest_blobs():
+        with lock:
+            if not listing:
+                blobs = {path: blob for path, blob in mirrors.list_blobs(repo_url).items()
+                         if PurePosixPath(path).name == "Cargo.toml"}
+                listing["blobs"] = blobs
+                listing["all"] = hashlib.sha256(
+                    json.dumps(sorted(blobs.items())).encode()).hexdigest()[:16]
+        return listing
+
+    def fingerprint(name):
+        current = manifest_blobs()
+        if name == "ROOT":
+            return "*@" + current["all"]
+        if manifests:
+            path = manifests.get(name)
+        else:
+            old = snapshot.nodes.get(name)
+            path = old["hash"].rpartition("@")[0] if old else None
+        if not path:
+            return "-"
+        return "{}@{}".format(path, current["blobs"].get(path, "missing"))
+    return fingerprint
 
 
 # -------------------------
-# MAIN PROGRAM
+# GRAPH BUILDING
 # -------------------------
 
-def main():
-    parser = argparse.ArgumentParser(description="Dependency Visualizer - Stage 5")
-    parser.add_argument("--config", "-c", required=True)
-    parser.add_argument("--test-graph", help="Path to A: B C style graph file (test mode)")
-    args = parser.parse_args()
+def run_bfs(cfg: dict, root, loader, test_graph=None, concurrent=False,
+            snapshot=None, fingerprint=None, stream=False, edge_kind=None,
+            choices=None):
+    """
+    Runs the serial or the concurrent BFS depending on the config.
 
-    cfg = load_config(Path(args.config))
-    validate_config(cfg)
+    Optional config fields:
+    - "concurrent_bfs": overrides `concurrent` (true in real mode,
+      false for the test graph and Cargo.lock where lookups are cheap)
+    - "max_workers": size of the loader thread pool
+
+    With a GraphSnapshot, nodes whose fingerprint did not change since
+    the last run are answered from the snapshot (test graphs bring
+    their own per-line fingerprint). The source's edge_kind is stored
+    with the nodes, so use snapshot.edge_kind for the result; choices
+    are replayed for reused nodes (see GraphSnapshot.wrap).
+
+    With stream=True an edge generator is returned instead of a list.
+    """
+    concurrent = cfg.get("concurrent_bfs", concurrent)
+
+    if snapshot is not None:
+        if test_graph is not None:
+            loader = partial(test_graph.get, default=[])
+            fingerprint = fingerprint or test_graph.fingerprint
+            test_graph = None
+        loader = snapshot.wrap(loader, fingerprint, edge_kind, choices)
+
+    if concurrent:
+        bfs = iter_bfs_graph_concurrent if stream else build_bfs_graph_concurrent
+        return bfs(
+            root=root,
+            dependency_loader=loader,
+            max_depth=cfg["max_depth"],
+            filter_substring=cfg["filter_substring"],
+            test_graph=test_graph,
+            max_workers=cfg.get("max_workers", DEFAULT_MAX_WORKERS)
+        )
+
+    bfs = iter_bfs_graph if stream else build_bfs_graph
+    return bfs(
+        root=root,
+        dependency_loader=loader,
+        max_depth=cfg["max_depth"],
+        filter_substring=cfg["filter_substring"],
+        test_graph=test_graph
+    )
 
+
+def report(cfg: dict, edges, snapshot=None, schedule=None, edge_kind=None, root=None):
+    """
+    Stages 3-5 output: graph, topological order, comparison, D2.
+
+    schedule: None, or {"costs": {crate: cost} or None,
+    "json": output path or None} to print / export the build layers.
+    edge_kind: optional function(src, dst) -> "normal" / "dev" / "build"
+    used to style the D2 edges.
+    root: BFS root, the default centre of the khop summary.
+    """
+    graph = Graph.from_edges(edges)
+    print_graph(graph)
+
+    # Stage 4: Topological sort (a stable order is always sorted from
+    # scratch: a patched one depends on what the snapshot stored)
+    tie_break = cfg.get("order_tie_break")
+    if snapshot is not None and snapshot.order and not tie_break:
+        order, ok = patch_topological_order(snapshot.order, graph)
+    else:
+        order, ok = topological_sort(graph, tie_break)
+    components = cycles = None
+    if not ok:
+        components = strongly_connected_components(graph)
+        cycles = find_cycles(graph, components)
+    print_topological(order, ok, components, cycles)
+    if tie_break:
+        print(f"Order digest: {order_digest(order)}")
+
+    if schedule is not None and ok:
+        plan = build_schedule(graph, schedule["costs"])
+        print_schedule(plan)
+        if schedule["json"]:
+            Path(schedule["json"]).write_text(json.dumps(plan, indent=2), encoding="utf-8")
+            print(f"Schedule saved to: {schedule['json']}")
+    elif schedule is not None:
+        print("\nBuild schedule skipped: graph contains cycles.")
+
+    # Stage 4: Comparison (our order lists dependents first,
+    # Cargo's build order dependencies first)
+    if cfg.get("cargo_order"):
+        cargo_order = load_cargo_order(cfg["cargo_order"])
+        diff = compare_with_cargo(order[::-1], cargo_order, graph)
+    else:
+        diff = compare_with_cargo(order, order)
+    print_diff(diff)
+
+    # Stage 5: D2 Export (and the other formats)
+    export_edges = apply_summaries(cfg, graph, root)
+    saved, _ = export(cfg, export_edges, edge_kind)
+    if cfg.get("render"):
+        render(cfg, export_edges, edge_kind)
+    print_exports(saved, d2_hint=not cfg.get("render"))
+
+    if snapshot is not None:
+        added, removed = snapshot.update(edges, order)
+        snapshot.save()
+        print_incremental(snapshot, added, removed)
+
+
+def export_path(cfg: dict, fmt: str = "d2") -> str:
+    """output_image_name with the format's suffix (plus .gz / .zst when compressed)."""
+    writer = FORMATS[fmt]
+    path = cfg["output_image_name"].replace(".svg", writer.suffix)
+    if writer.binary:
+        return path
+    suffix = {"gzip": ".gz", "zstd": ".zst"}.get(cfg.get("d2_compression"), "")
+    if not path.endswith(suffix):
+        path += suffix
+    return path
+
+
+def export(cfg: dict, edges, edge_kind=None):
+    """
+    Write every format in cfg["export_formats"] (default: only D2)
+    in one pass over the edges. "d2_compression" applies to all text
+    formats. Returns (paths, number of distinct edges).
+    """
+    formats = cfg.get("export_formats") or ["d2"]
+    outputs = {fmt: export_path(cfg, fmt) for fmt in dict.fromkeys(formats)}
+    return export_graph(edges, outputs, cfg.get("d2_compression"),
+                        group_by=cfg.get("d2_group_by"), edge_kind=edge_kind)
+
+
+def reduce_edges(cfg: dict, edges):
+    """Transitive reduction of the BFS edges when cfg["transitive_reduction"] is set."""
+    if not cfg.get("transitive_reduction"):
+        return edges
+    edges = list(edges)
+    start = time.perf_counter()
+    reduced = transitive_reduction(edges)
+    elapsed = time.perf_counter() - start
+    print("\n=== Transitive Reduction ===")
+    print(f"{len(edges)} -> {len(reduced)} edges ({elapsed:.2f} s)")
+    return reduced
+
+
+def apply_summaries(cfg: dict, edges, root=None):
+    """
+    Shrink the graph for export with the summary modes listed in
+    cfg["summary"], applied in order. Without summaries the edges are
+    returned as they are (a generator stays a generator).
+
+    Optional config fields:
+    - "summary_node": centre of "khop" (default: root, the BFS root,
+      else package_name)
+    - "summary_hops": k for "khop" (default: 2)
+    - "summary_direction": "out", "in" or "both" (default) for "khop"
+    - "summary_top": N for "top" (default: 50)
+    """
+    modes = cfg.get("summary") or []
+    if isinstance(modes, str):
+        modes = [modes]
+    if not modes:
+        return edges
+
+    edges = list(edges)
+    print("\n=== Summary ===")
+    for mode in modes:
+        before = len(edges)
+        try:
+            edges = summarize(
+                edges, mode,
+                node=cfg.get("summary_node", root or cfg["package_name"]),
+                hops=cfg.get("summary_hops", 2),
+                top=cfg.get("summary_top", 50),
+                direction=cfg.get("summary_direction", "both")
+            )
+        except KeyError as e:
+            print(f"ERROR: {e.args[0]}", file=sys.stderr)
+            sys.exit(1)
+        print(f"{mode}: {before} -> {len(edges)} edges")
+    return edges
+
+
+def export_stream(cfg: dict, edges, edge_kind=None, root=None):
+    """Write an edge generator to the D2 file as the BFS produces it."""
+    start = time.perf_counter()
+    saved, count = export(cfg, apply_summaries(cfg, edges, root), edge_kind)
+    elapsed = time.perf_counter() - start
+    print_exports(saved)
+    print(f"Streamed {count} edges in {elapsed:.2f} s")
+
+
+def render(cfg: dict, graph, edge_kind=None):
+    """
+    Render the graph to output_image_name (or numbered tiles).
+
+    Optional config fields:
+    - "renderer": "auto" (default), "d2" or "python"
+    - "render_cache_dir": where renders are cached by D2 source hash
+    - "tile_by": "scc" (default) or "layer"
+    - "max_tile_nodes": larger graphs are split into tiles
+    - "render_workers": renders at a time (default: number of CPUs;
+      separate from the BFS "max_workers")
+    - "d2_binary", "d2_layout", "render_timeout": options for d2
+    """
+    renderer = Renderer(
+        backend=cfg.get("renderer", "auto"),
+        cache_dir=cfg.get("render_cache_dir", DEFAULT_RENDER_CACHE),
+        max_workers=cfg.get("render_workers"),
+        d2_binary=cfg.get("d2_binary"),
+        layout=cfg.get("d2_layout"),
+        timeout=cfg.get("render_timeout", DEFAULT_TIMEOUT)
+    )
+    results = renderer.render(
+        graph, cfg["output_image_name"],
+        tile_by=cfg.get("tile_by", "scc"),
+        max_tile_nodes=cfg.get("max_tile_nodes", DEFAULT_MAX_TILE_NODES),
+        group_by=cfg.get("d2_group_by"),
+        edge_kind=edge_kind
+    )
+    print_render(renderer, results)
+
+
+def _stream_test_graph(cfg: dict, root, path):
+    """Edge generator that keeps the test graph file open while it runs."""
+    with open_test_graph(path) as test_graph:
+        yield from run_bfs(cfg, root, None, test_graph, stream=True)
+
+
+def load_edges(cfg: dict, args, snapshot=None, stream=False):
+    """
+    Builds the BFS edge list from the configured source: test graph,
+    Cargo.lock, sparse index or the real repository (paths from args,
+    else from the "test_graph", "cargo_lock" and "sparse_index" fields).
+    Returns (edges, manifest cache or None, edge kind function or None,
+    BFS root); the edge kind (normal / dev / build) is known for the
+    sparse index and the real repository, where it styles the D2
+    edges. The root is
+    package_name, its Cargo.lock node name or "ROOT" in real mode.
+
+    With stream=True, edges is a generator that runs the BFS lazily.
+    """
     root = cfg["package_name"]
-    max_depth = cfg["max_depth"]
-    filter_substr = cfg["filter_substring"]
 
     # =====================================
     # TEST MODE
     # =====================================
     if cfg["use_test_repo"]:
-        if not args.test_graph:
+        test_graph_path = args.test_graph or cfg.get("test_graph")
+        if not test_graph_path:
             print("ERROR: Test mode enabled but no --test-graph given.", file=sys.stderr)
             sys.exit(1)
 
-        test_graph = load_test_graph(args.test_graph)
+        if stream:
+            return _stream_test_graph(cfg, root, test_graph_path), None, None, root
 
-        edges = build_bfs_graph(
-            root=root,
-            dependency_loader=None,
-            max_depth=max_depth,
-            filter_substring=filter_substr,
-            test_graph=test_graph
+        with open_test_graph(test_graph_path) as test_graph:
+            edges = run_bfs(cfg, root, None, test_graph, snapshot=snapshot)
+        return edges, None, None, root
+
+    # =====================================
+    # LOCKFILE MODE (NO NETWORK)
+    # =====================================
+    cargo_lock = args.cargo_lock or cfg.get("cargo_lock")
+    if cargo_lock:
+        index = LockfileIndex(cargo_lock)
+        root = index.resolve(root, cfg["package_version"])
+        edges = run_bfs(cfg, root, index.loader, snapshot=snapshot,
+                        fingerprint=index.fingerprint, stream=stream)
+        return edges, None, None, root
+
+    # =====================================
+    # SPARSE INDEX MODE (LOCAL INDEX MIRROR)
+    # =====================================
+    sparse_index = args.sparse_index or cfg.get("sparse_index")
+    if sparse_index:
+        index = SparseIndex(sparse_index,
+                            kinds=tuple(cfg.get("dependency_kinds", ("normal", "build"))))
+        index.pin(root, cfg["package_version"])
+        edges = run_bfs(cfg, root, index.loader, snapshot=snapshot,
+                        fingerprint=index.fingerprint, stream=stream,
+                        edge_kind=index.edge_kind, choices=index)
+        return edges, None, snapshot.edge_kind if snapshot else index.edge_kind, root
+
+    # =====================================
+    # REAL MODE (CLONE + PARSE)
+    # =====================================
+
+    cache = None
+    if cfg.get("cache_dir"):
+        cache = ManifestCache(
+            cfg["cache_dir"],
+            max_bytes=cfg.get("cache_max_bytes", DEFAULT_MAX_BYTES),
+            max_age=cfg.get("cache_max_age", DEFAULT_MAX_AGE)
         )
 
-        print_graph(edges)
+    mirrors = None
+    if cfg.get("mirror_dir"):
+        mirrors = MirrorPool(cfg["mirror_dir"])
+
+    manifests = {}
+    loader, edge_kind = dependency_loader_factory(
+        cfg["repository_url"], cache, mirrors,
+        max_workers=cfg.get("max_workers", DEFAULT_MAX_WORKERS),
+        manifests=manifests
+    )
+
+    fingerprint = None
+    if snapshot is not None and mirrors is not None:
+        fingerprint = manifest_fingerprint(cfg["repository_url"], mirrors, snapshot, manifests)
+    elif snapshot is not None:
+        # Without a mirror there is no cheap per-file listing: everything
+        # loaded from the repository changes with its commit
+        commit = resolve_head(cfg["repository_url"])
+
+        def fingerprint(name):
+            return commit
 
-        # Stage 4: Topological sort
-        order, ok = topological_sort(edges)
-        print_topological(order, ok)
+    edges = run_bfs(cfg, "ROOT", loader, concurrent=True, snapshot=snapshot,
+                    fingerprint=fingerprint, stream=stream, edge_kind=edge_kind)
+    return edges, cache, snapshot.edge_kind if snapshot else edge_kind, "ROOT"
 
-        # Stage 4: Comparison
-        diff = compare_with_cargo(order, order)  # same order for stage 4
-        print_diff(diff)
 
-        # Stage 5: D2 Export
-        d2_path = cfg["output_image_name"].replace(".svg", ".d2")
-        saved = export_to_d2(edges, d2_path)
-        print_d2_message(saved)
+# -------------------------
+# QUERIES
+# -------------------------
 
+def run_query(edges, kind: str, nodes):
+    """Answer one reachability query over the built graph."""
+    index = ReachabilityIndex(edges)
+
+    if kind in ("reaches", "why"):
+        a, b = nodes
+        if kind == "reaches":
+            answer = "yes" if index.reaches(a, b) else "no"
+            print(f"{a} depends on {b}: {answer}")
+        else:
+            path = index.why(a, b)
+            if path is None:
+                print(f"{a} does not depend on {b}")
+            else:
+                print(" -> ".join(path))
         return
 
-    # =====================================
-    # REAL MODE (CLONE + PARSE)
-    # =====================================
+    for node in nodes:
+        if kind == "deps":
+            found = index.dependencies(node)
+        else:
+            found = index.dependents(node)
+        title = "Dependencies of" if kind == "deps" else "Crates depending on"
+        print(f"\n=== {title} {node} ({len(found)}) ===")
+        for name in found:
+            print(name)
 
-    loader = dependency_loader_factory(cfg["repository_url"])
 
-    edges = build_bfs_graph(
-        root="ROOT",
-        dependency_loader=loader,
-        max_depth=max_depth,
-        filter_substring=filter_substr
-    )
+# -------------------------
+# MAIN PROGRAM
+# -------------------------
 
-    print_graph(edges)
+def main():
+    parser = argparse.ArgumentParser(description="Dependency Visualizer - Stage 5")
+    parser.add_argument("--config", "-c", required=True)
+    parser.add_argument("--test-graph", help="Path to A: B C style graph file (test mode)")
+    parser.add_argument("--cargo-lock", help="Path to Cargo.lock (offline real mode)")
+    parser.add_argument("--sparse-index", help="Path to a local crates.io sparse index mirror")
+    parser.add_argument("--snapshot", help="Graph snapshot file for incremental rebuilds")
+    parser.add_argument("--cargo-order",
+                        help="Cargo build order: unit-graph / metadata JSON or crate list")
+    parser.add_argument("--stable-order", choices=[t for t in TIE_BREAKS if t],
+                        help="Deterministic topological order (tie break by "
+                             "BFS discovery or by name)")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Print parallel build layers and the critical path")
+    parser.add_argument("--schedule-json", help="Also export the build schedule as JSON")
+    parser.add_argument("--build-costs", help="JSON file {crate: build cost estimate}")
+    parser.add_argument("--export-only", action="store_true",
+                        help="Stream BFS edges straight into the D2 file "
+                             "(no graph, sorting or snapshot)")
+    parser.add_argument("--format", action="append", choices=list(FORMATS),
+                        help="Export format (repeat for several; default: d2)")
+    parser.add_argument("--compress", choices=[c for c in COMPRESSIONS if c],
+                        help="Compress the text exports (default: from the file suffix)")
+    parser.add_argument("--group-by", choices=[g for g in GROUP_BY if g],
+                        help="Group D2 nodes into containers by BFS depth or crate namespace")
+    parser.add_argument("--transitive-reduction", action="store_true",
+                        help="Drop edges implied by longer paths before sorting")
+    parser.add_argument("--summary", action="append", choices=SUMMARY_MODES,
+                        help="Shrink the exported graph: k-hop neighbourhood, "
+                             "transitive reduction, SCC collapse or top-N by "
+                             "fan-in (repeat to chain)")
+    parser.add_argument("--around", help="Crate the khop summary is centred on")
+    parser.add_argument("--hops", type=int, help="k for the khop summary")
+    parser.add_argument("--top", type=int, help="N for the top summary")
+    parser.add_argument("--render", action="store_true",
+                        help="Render output_image_name with d2 or the built-in layout")
+    parser.add_argument("--renderer", choices=BACKENDS,
+                        help="d2 binary, built-in python layout, or auto (default)")
+    parser.add_argument("--tile-by", choices=TILE_BY,
+                        help="Split large graphs per SCC (default) or per layer")
+
+    sub = parser.add_subparsers(dest="command")
+    query = sub.add_parser("query", help="Reachability queries over the built graph")
+    query.add_argument("kind", choices=["reaches", "why", "deps", "rdeps"],
+                       help="reaches A B | why A B | deps X.. | rdeps X..")
+    query.add_argument("nodes", nargs="+")
+
+    serve = sub.add_parser("serve", help="Keep the graph in memory and answer HTTP queries")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--refresh", type=float, default=30.0,
+                       help="Seconds between source change checks (0 = never)")
+    args = parser.parse_args()
+    if args.command == "query" and args.kind in ("reaches", "why") and len(args.nodes) != 2:
+        parser.error(f"query {args.kind} needs exactly two crates: A B")
+    if args.export_only and args.command:
+        parser.error("--export-only cannot be combined with a subcommand")
 
-    # Stage 4: Topological sort
-    order, ok = topological_sort(edges)
-    print_topological(order, ok)
+    cfg = load_config(Path(args.config))
+    validate_config(cfg)
 
-    # Stage 4: Comparison (placeholder)
-    diff = compare_with_cargo(order, order)
-    print_diff(diff)
+    if args.stable_order:
+        cfg["order_tie_break"] = args.stable_order
+    if args.cargo_order:
+        cfg["cargo_order"] = args.cargo_order
+    if args.format:
+        cfg["export_formats"] = args.format
+    if args.compress:
+        cfg["d2_compression"] = args.compress
+    if args.group_by:
+        cfg["d2_group_by"] = args.group_by
+    if args.transitive_reduction:
+        cfg["transitive_reduction"] = True
+    if args.summary:
+        cfg["summary"] = args.summary
+    if args.around:
+        cfg["summary_node"] = args.around
+    if args.hops is not None:
+        cfg["summary_hops"] = args.hops
+    if args.top is not None:
+        cfg["summary_top"] = args.top
+    if args.render or args.renderer:
+        cfg["render"] = True
+    if args.renderer:
+        cfg["renderer"] = args.renderer
+    if args.tile_by:
+        cfg["tile_by"] = args.tile_by
+
+    schedule = None
+    if args.schedule or args.schedule_json:
+        costs = cfg.get("build_costs")
+        if args.build_costs:
+            costs = load_config(Path(args.build_costs))
+        schedule = {"costs": costs, "json": args.schedule_json}
+
+    snapshot = None
+    snapshot_path = args.snapshot or cfg.get("snapshot")
+    if snapshot_path:
+        snapshot = GraphSnapshot(snapshot_path)
+
+    if args.command == "serve":
+        server = GraphServer(
+            build=lambda: reduce_edges(cfg, load_edges(cfg, args)[0]),
+            stamp=lambda: source_stamp(cfg, args),
+            refresh_interval=args.refresh
+        )
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.export_only:
+        edges, cache, edge_kind, root = load_edges(cfg, args, stream=True)
+        export_stream(cfg, reduce_edges(cfg, edges), edge_kind, root)
+        if cache is not None:
+            print_cache_stats(cache)
+        return
+
+    edges, cache, edge_kind, root = load_edges(cfg, args, snapshot)
+    edges = reduce_edges(cfg, edges)
+
+    if args.command == "query":
+        try:
+            run_query(edges, args.kind, args.nodes)
+        except KeyError as e:
+            print(f"ERROR: {e.args[0]}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    report(cfg, edges, snapshot, schedule, edge_kind, root)
+
+    if cache is not None:
+        print_cache_stats(cache)
 
-    # Stage 5: Export to D2
-    d2_path = cfg["output_image_name"].replace(".svg", ".d2")
-    saved = export_to_d2(edges, d2_path)
-    print_d2_message(saved)
+    if FETCH_STATS.clones:
+        print_fetch_stats(FETCH_STATS.as_dict())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+"""
+manifest_cache.py - Stage 5 (Variant 27)
+
+Persistent on-disk cache of parsed Cargo.toml dependency lists
+(one list per crate, several for a workspace).
+
+Entries are keyed by (repository_url, commit hash), so a repository
+that did not change since the last run is answered without a clone.
+The current commit is resolved with a cheap `git ls-remote`.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "dependency_visualizer"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+
+def resolve_head(repo_url: str) -> str:
+    """Return the commit hash HEAD points to, without cloning."""
+    try:
+        result = subprocess.run(
+            ["git", "ls-remote", repo_url, "HEAD"],
+            check=True,
+            capture_output=True
+        )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError("Failed to resolve HEAD: {}".format(e.stderr.decode()))
+
+    line = result.stdout.decode().strip()
+    if not line:
+        raise RuntimeError("Repository has no HEAD: {}".format(repo_url))
+    return line.split()[0]
+
+
+class ManifestCache:
+    """
+    Directory of small JSON files, one per (url, commit).
+
+    Eviction drops entries older than max_age seconds, then the least
+    recently used ones until the directory fits into max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, repo_url: str, commit: str) -> Path:
+        key = hashlib.sha256("{}\0{}".format(repo_url, commit).encode()).hexdigest()
+        return self.cache_dir / (key + ".json")
+
+    def get(self, repo_url: str, commit: str, manifests=None):
+        """
+        Return the cached {crate: [(name, version, kind)]} graph or None.
+        A manifests dict is filled with the stored {crate: Cargo.toml path}.
+        """
+        path = self._entry_path(repo_url, commit)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            graph = data["graph"]
+            expired = time.time() - path.stat().st_mtime > self.max_age
+            if expired:
+                path.unlink(missing_ok=True)
+            else:
+                # Touch the file so eviction sees it as recently used
+                os.utime(path)
+        except (OSError, ValueError, KeyError):
+            # Also when another process evicted the entry meanwhile
+            expired = True
+        if expired:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        if manifests is not None:
+            manifests.update(data.get("manifests", {}))
+        return {crate: [tuple(dep) for dep in deps]
+                for crate, deps in graph.items()}
+
+    def put(self, repo_url: str, commit: str, graph: dict, manifests=None):
+        """Store the dependency lists of a repository and run eviction."""
+        data = {"url": repo_url, "commit": commit, "graph": graph}
+        if manifests:
+            data["manifests"] = manifests
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self._entry_path(repo_url, commit))
+        self.evict()
+
+    def evict(self):
+        """Remove expired entries and shrink the cache to max_bytes."""
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
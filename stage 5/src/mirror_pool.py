@@ -0,0 +1,116 @@
+"""
+mirror_pool.py - Stage 5 (Variant 27)
+
+Persistent store of bare git mirrors.
+
+Instead of cloning into a temp directory and deleting it on every
+call, each repository is mirrored once and refreshed with incremental
+fetches. Files are read straight from the object database with
+`git show`, so no working tree is ever checked out.
+"""
+
+import fcntl
+import hashlib
+import subprocess
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+DEFAULT_MIRROR_DIR = Path.home() / ".cache" / "dependency_visualizer" / "mirrors"
+
+
+def _git(args, cwd=None):
+    try:
+        return subprocess.run(
+            ["git"] + args,
+            check=True,
+            capture_output=True,
+            cwd=cwd
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError("git {} failed: {}".format(args[0], e.stderr.decode()))
+
+
+class MirrorPool:
+    """
+    Bare mirrors under root_dir, one per repository URL.
+
+    Every mirror is fetched at most once per pool. Threads asking for
+    the same URL wait for the fetch already in progress, and a lock
+    file keeps several processes from updating one mirror at once.
+    """
+
+    def __init__(self, root_dir=DEFAULT_MIRROR_DIR):
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._fresh = set()
+
+    def mirror_path(self, repo_url: str) -> Path:
+        key = hashlib.sha256(repo_url.encode()).hexdigest()[:16]
+        return self.root_dir / (key + ".git")
+
+    def _url_lock(self, repo_url: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(repo_url, threading.Lock())
+
+    @contextmanager
+    def _process_lock(self, mirror: Path):
+        with open(str(mirror) + ".lock", "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _fetch(self, repo_url: str, mirror: Path):
+        if (mirror / "HEAD").exists():
+            _git(["--git-dir", str(mirror), "fetch", "--prune", "--quiet", "origin"])
+        else:
+            # Blobs are fetched lazily by `git show`, so only the
+            # manifests we actually read are transferred
+            _git(["clone", "--mirror", "--filter=blob:none", "--quiet",
+                  repo_url, str(mirror)])
+
+    def ensure(self, repo_url: str) -> Path:
+        """Create or refresh the mirror of repo_url and return its path."""
+        mirror = self.mirror_path(repo_url)
+        with self._url_lock(repo_url):
+            if repo_url in self._fresh:
+                return mirror
+            with self._process_lock(mirror):
+                self._fetch(repo_url, mirror)
+            self._fresh.add(repo_url)
+        return mirror
+
+    def head_commit(self, repo_url: str) -> str:
+        """Commit hash of HEAD in the (refreshed) mirror."""
+        mirror = self.ensure(repo_url)
+        return _git(["--git-dir", str(mirror), "rev-parse", "HEAD"]).decode().strip()
+
+    def list_files(self, repo_url: str, rev: str = "HEAD"):
+        """All file paths at rev, read from the tree objects only."""
+        mirror = self.ensure(repo_url)
+        out = _git(["--git-dir", str(mirror), "ls-tree", "-r", "--name-only", rev])
+        return out.decode("utf-8").splitlines()
+
+    def list_blobs(self, repo_url: str, rev: str = "HEAD") -> dict:
+        """{path: blob id} of every file at rev, from the tree objects only."""
+        mirror = self.ensure(repo_url)
+        out = _git(["--git-dir", str(mirror), "ls-tree", "-r", rev])
+        blobs = {}
+        for line in out.decode("utf-8").splitlines():
+            info, path = line.split("\t", 1)
+            blobs[path] = info.split()[2]
+        return blobs
+
+    def read_file(self, repo_url: str, path: str, rev: str = "HEAD") -> str:
+        """Read a file at rev from the mirror without a checkout."""
+        mirror = self.ensure(repo_url)
+        try:
+            data = _git(["--git-dir", str(mirror), "show", "{}:{}".format(rev, path)])
+        except RuntimeError:
+            raise FileNotFoundError("{} not found in repository.".format(path))
+        return data.decode("utf-8")
@@ -0,0 +1,120 @@
+"""
+reachability.py - Stage 5 (Variant 27)
+
+Precomputed reachability over a built dependency graph, for repeated
+"does A depend on B" / "why" / "who depends on X" questions.
+
+The graph is condensed into its strongly connected components, and
+each component gets a bitset (a Python int) of every component it can
+reach, filled in reverse topological order. reaches() is then a single
+bit test.
+"""
+
+from collections import deque
+
+from graph import Graph
+from topo_sort import as_graph, condense
+
+
+class ReachabilityIndex:
+    """
+    Transitive-closure index over a Graph or edge list.
+
+    An edge A -> B means A depends on B, so reaches(A, B) answers
+    "does A (transitively) depend on B".
+    """
+
+    def __init__(self, edges):
+        self.graph = as_graph(edges)
+        self.reverse = self.graph.reversed()
+        components, component_of, dag = condense(self.graph)
+        self.components = components
+        self.component_of = component_of
+
+        # Components are topologically ordered and every DAG edge goes
+        # to a later component, so walking backwards sees successors first
+        reach = [0] * len(components)
+        for c in range(len(components) - 1, -1, -1):
+            bits = 1 << c
+            for succ in dag.successors(c):
+                bits |= reach[succ]
+            reach[c] = bits
+        self._reach = reach
+
+    def _check(self, node):
+        if node not in self.component_of:
+            raise KeyError("Unknown crate: {}".format(node))
+
+    def reaches(self, a, b) -> bool:
+        """True if a depends on b directly or transitively (or a == b)."""
+        self._check(a)
+        self._check(b)
+        return bool(self._reach[self.component_of[a]] >> self.component_of[b] & 1)
+
+    def why(self, a, b):
+        """
+        Shortest dependency path from a to b as a list of crates, or
+        None. The BFS only enters crates that can still reach b.
+        """
+        if not self.reaches(a, b):
+            return None
+
+        graph = self.graph
+        names = graph.names
+        target = graph.node_id(b)
+        target_comp = self.component_of[b]
+        reach = self._reach
+        comp_of = self.component_of
+
+        start = graph.node_id(a)
+        parent = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node == target:
+                break
+            for neigh in graph.successors(node):
+                if neigh in parent:
+                    continue
+                if not reach[comp_of[names[neigh]]] >> target_comp & 1:
+                    continue
+                parent[neigh] = node
+                queue.append(neigh)
+
+        path = []
+        node = target
+        while node is not None:
+            path.append(names[node])
+            node = parent[node]
+        return path[::-1]
+
+    def _walk(self, graph: Graph, start):
+        self._check(start)
+        names = graph.names
+        first = graph.node_id(start)
+        seen = {first}
+        queue = deque([first])
+        result = []
+        while queue:
+            node = queue.popleft()
+            for neigh in graph.successors(node):
+                if neigh not in seen:
+                    seen.add(neigh)
+                    result.append(names[neigh])
+                    queue.append(neigh)
+        return result
+
+    def dependencies(self, node):
+        """Every crate node depends on, nearest first."""
+        return self._walk(self.graph, node)
+
+    def dependents(self, node):
+        """Every crate that depends on node (reverse dependencies), nearest first."""
+        return self._walk(self.reverse, node)
+
+    def direct_dependents(self, node):
+        """Crates with an edge to node."""
+        self._check(node)
+        names = self.graph.names
+        direct = self.reverse.successors(self.graph.node_id(node))
+        return [names[i] for i in dict.fromkeys(direct)]
@@ -0,0 +1,209 @@
+"""
+renderer.py - Stage 5 (Variant 27)
+
+Render stage: turns the dependency graph into SVG images.
+
+Backends:
+- "d2": the locally installed `d2` binary, one subprocess per image,
+  at most max_workers running at the same time
+- "python": the built-in layered layout from svg_layout, run on a
+  process pool when there are several images
+- "auto": d2 when it is on PATH, python otherwise
+
+Renders are cached by the SHA-256 of the D2 source (plus backend and
+layout engine), so an unchanged graph is copied from the cache instead
+of being rendered again.
+
+Graphs with more than max_tile_nodes nodes are split into tiles:
+strongly connected components (tile_by="scc") or condensation layers
+(tile_by="layer") are packed in topological order into tiles of at most
+max_tile_nodes nodes. Every edge is drawn in the tile of its source.
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pathlib import Path
+
+from d2_exporter import d2_lines
+from svg_layout import render_svg
+from topo_sort import condense
+
+
+BACKENDS = ("auto", "d2", "python")
+TILE_BY = ("scc", "layer")
+DEFAULT_RENDER_CACHE = Path.home() / ".cache" / "dependency_visualizer" / "renders"
+DEFAULT_MAX_TILE_NODES = 200
+DEFAULT_TIMEOUT = 120.0
+
+
+def find_d2(binary=None):
+    """Path of the d2 binary (given or on PATH), None if not installed."""
+    return shutil.which(binary or "d2")
+
+
+def split_tiles(edges, tile_by: str = "scc", max_tile_nodes: int = DEFAULT_MAX_TILE_NODES):
+    """
+    Split a graph into tiles of at most max_tile_nodes source nodes
+    (a single component or layer larger than that is one tile).
+    Returns a list of edge lists, one whole-graph tile if it is small.
+    """
+    if tile_by not in TILE_BY:
+        raise ValueError(f"Unknown tiling: {tile_by!r} (expected one of {TILE_BY})")
+
+    edges = list(edges)
+    components, component_of, dag = condense(edges)
+    if len(component_of) <= max_tile_nodes:
+        return [edges]
+
+    if tile_by == "scc":
+        units = components
+    else:
+        # Components are topologically ordered, so one pass gives depths
+        depth = [0] * len(components)
+        for c in range(len(components)):
+            for d in dag.successors(c):
+                depth[d] = max(depth[d], depth[c] + 1)
+        units = [[] for _ in range(max(depth) + 1)]
+        for c, comp in enumerate(components):
+            units[depth[c]].extend(comp)
+
+    tile_of = {}
+    tiles = 0
+    size = 0
+    for unit in units:
+        if size and size + len(unit) > max_tile_nodes:
+            tiles += 1
+            size = 0
+        for name in unit:
+            tile_of[name] = tiles
+        size += len(unit)
+
+    out = [[] for _ in range(tiles + 1)]
+    for src, dst in edges:
+        out[tile_of[src]].append((src, dst))
+    return [tile for tile in out if tile]
+
+
+def _render_python(edges, edge_kinds, out_path):
+    Path(out_path).write_text(render_svg(edges, edge_kinds=edge_kinds), encoding="utf-8")
+
+
+class Renderer:
+    """
+    Renders edge lists to SVG files through the render cache.
+    Counts cache hits and fresh renders.
+    """
+
+    def __init__(self, backend: str = "auto", cache_dir=DEFAULT_RENDER_CACHE,
+                 max_workers: int = None, d2_binary: str = None, layout: str = None,
+                 timeout: float = DEFAULT_TIMEOUT):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown renderer: {backend!r} (expected one of {BACKENDS})")
+
+        self.d2 = find_d2(d2_binary)
+        if backend == "auto":
+            backend = "d2" if self.d2 else "python"
+        elif backend == "d2" and self.d2 is None:
+            raise RuntimeError("d2 binary not found (install it from https://d2lang.com "
+                               "or use the python renderer).")
+
+        self.backend = backend
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.layout = layout
+        self.timeout = timeout
+        self.hits = 0
+        self.rendered = 0
+
+    def cache_key(self, source: str) -> str:
+        h = hashlib.sha256()
+        h.update(f"{self.backend}\0{self.layout or ''}\0".encode("utf-8"))
+        h.update(source.encode("utf-8"))
+        return h.hexdigest()
+
+    def _render_d2(self, source: str, out_path: Path):
+        with tempfile.TemporaryDirectory(prefix="d2_") as tmp:
+            src = Path(tmp) / "graph.d2"
+            src.write_text(source, encoding="utf-8")
+            cmd = [self.d2]
+            if self.layout:
+                cmd.append(f"--layout={self.layout}")
+            cmd += [str(src), str(out_path)]
+            try:
+                subprocess.run(cmd, check=True, capture_output=True, timeout=self.timeout)
+            except subprocess.CalledProcessError as e:
+                raise RuntimeError("d2 failed: {}".format(e.stderr.decode().strip()))
+            except subprocess.TimeoutExpired:
+                raise RuntimeError("d2 timed out after {} s".format(self.timeout))
+
+    def render(self, edges, output_path, tile_by: str = "scc",
+               max_tile_nodes: int = DEFAULT_MAX_TILE_NODES,
+               group_by=None, edge_kind=None):
+        """
+        Render the graph to output_path, or to output-001.svg,
+        output-002.svg, ... when it is split into tiles.
+        Returns a list of (path, cached) in tile order.
+        """
+        output_path = Path(output_path)
+        tiles = split_tiles(edges, tile_by, max_tile_nodes)
+
+        jobs = []
+        for i, tile in enumerate(tiles, 1):
+            if len(tiles) == 1:
+                path = output_path
+            else:
+                path = output_path.with_name(f"{output_path.stem}-{i:03d}{output_path.suffix}")
+            source = "\n".join(d2_lines(tile, group_by, edge_kind))
+            cached = self.cache_dir / (self.cache_key(source) + ".svg")
+            jobs.append((tile, source, cached, path))
+
+        # Identical tiles share one cache entry and one render
+        todo = {}
+        for job in jobs:
+            if not job[2].exists():
+                todo[job[2]] = job
+        self._run(list(todo.values()), edge_kind)
+        self.rendered += len(todo)
+        self.hits += len(jobs) - len(todo)
+
+        results = []
+        for _, _, cached, path in jobs:
+            shutil.copyfile(cached, path)
+            results.append((path, cached not in todo))
+        return results
+
+    def _run(self, jobs, edge_kind):
+        """Render the missing cache entries, in parallel when there are several."""
+        if not jobs:
+            return
+
+        # Render to a temporary name, then move into the cache, so an
+        # interrupted render never leaves a broken entry behind (d2 picks
+        # the output format from the suffix, so it stays .svg)
+        def partial_path(cached):
+            return cached.with_name(f"{cached.stem}.{os.getpid()}.tmp.svg")
+
+        if self.backend == "d2":
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                list(pool.map(lambda job: self._render_d2(job[1], partial_path(job[2])), jobs))
+        else:
+            args = []
+            for tile, _, cached, _ in jobs:
+                kinds = None
+                if edge_kind is not None:
+                    kinds = {(s, t): edge_kind(s, t) for s, t in tile}
+                args.append((tile, kinds, str(partial_path(cached))))
+            if len(args) == 1 or self.max_workers == 1:
+                for a in args:
+                    _render_python(*a)
+            else:
+                with ProcessPoolExecutor(max_workers=min(self.max_workers, len(args))) as pool:
+                    list(pool.map(_render_python, *zip(*args)))
+
+        for job in jobs:
+            os.replace(partial_path(job[2]), job[2])
@@ -0,0 +1,208 @@
+"""
+server.py - Stage 5 (Variant 27)
+
+Long-running local query server.
+
+The graph is built once and kept in memory (Graph + ReachabilityIndex);
+requests are answered from it over plain HTTP on localhost. A
+background task checks whether the source changed (file stamp or
+repository HEAD) and rebuilds the graph, its reachability index and
+topological order in a worker thread; only the final swap runs on the
+event loop.
+
+Endpoints (all GET, JSON unless noted):
+  /health
+  /graph                      all edges
+  /bfs?root=X&depth=N         depth-limited BFS subgraph from X
+  /topo                       topological order
+  /deps?node=X                transitive dependencies
+  /rdeps?node=X               reverse dependencies
+  /reaches?a=X&b=Y
+  /why?a=X&b=Y                shortest dependency path
+  /d2[?root=X&depth=N]        D2 text of the graph or a subgraph
+                              (&group=depth|namespace for containers)
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+from d2_exporter import d2_lines
+from graph import Graph
+from graph_builder import build_bfs_graph
+from manifest_cache import resolve_head
+from reachability import ReachabilityIndex
+from topo_sort import topological_sort
+
+
+def source_stamp(cfg: dict, args) -> str:
+    """Cheap value that changes when the graph source changes."""
+    for path in ((args.test_graph or cfg.get("test_graph")) if cfg["use_test_repo"] else None,
+                 args.cargo_lock or cfg.get("cargo_lock"),
+                 args.sparse_index or cfg.get("sparse_index")):
+        if path:
+            st = Path(path).stat()
+            return "{}:{}:{}".format(path, st.st_mtime_ns, st.st_size)
+    return resolve_head(cfg["repository_url"])
+
+
+class GraphServer:
+    """
+    build: function() -> edge list, called on start and on refresh
+    stamp: function() -> str, compared between refresh checks
+    """
+
+    def __init__(self, build, stamp=None, refresh_interval: float = 30.0):
+        self._build = build
+        self._stamp = stamp
+        self.refresh_interval = refresh_interval
+        self.requests = 0
+        self.builds = 0
+        self._set_graph(self._prepare())
+        self._last_stamp = stamp() if stamp else None
+
+    def _prepare(self):
+        """Build the edges and everything derived from them (slow part)."""
+        graph = Graph.from_edges(self._build())
+        index = ReachabilityIndex(graph)
+        order, ok = topological_sort(graph)
+        return graph, index, order, ok
+
+    def _set_graph(self, prepared):
+        # Swap all at once so requests never see a half-updated state
+        self.graph, self.index, self.order, self.acyclic = prepared
+        self.built_at = time.time()
+        self.builds += 1
+
+    async def refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                stamp = await asyncio.to_thread(self._stamp)
+                if stamp != self._last_stamp:
+                    # Only the swap runs on the event loop
+                    prepared = await asyncio.to_thread(self._prepare)
+                    self._set_graph(prepared)
+                    self._last_stamp = stamp
+            except Exception as e:  # keep serving the old graph
+                print(f"Refresh failed: {e}")
+
+    # -------------------------
+    # REQUESTS
+    # -------------------------
+
+    def handle(self, target: str):
+        """Return (status, content type, body bytes) for a request target."""
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        route = url.path.rstrip("/") or "/health"
+        self.requests += 1
+
+        try:
+            if route == "/d2":
+                edges = self._subgraph(params) if "root" in params else self.graph
+                lines = d2_lines(edges, params.get("group"))
+                return 200, "text/plain", "\n".join(lines).encode("utf-8")
+            result = self._route(route, params)
+        except KeyError as e:
+            return 404, "application/json", _json({"error": str(e.args[0])})
+        except ValueError as e:
+            return 400, "application/json", _json({"error": str(e)})
+
+        if result is None:
+            return 404, "application/json", _json({"error": "unknown path " + route})
+        return 200, "application/json", _json(result)
+
+    def _subgraph(self, params):
+        root = _param(params, "root")
+        if root not in self.graph.ids:
+            raise KeyError("Unknown crate: {}".format(root))
+        return build_bfs_graph(
+            root, None, int(params.get("depth", 1 << 30)),
+            params.get("filter", ""), test_graph=self.graph
+        )
+
+    def _route(self, route, params):
+        index = self.index
+        if route == "/health":
+            return {"nodes": self.graph.num_nodes, "edges": self.graph.num_edges,
+                    "builds": self.builds, "built_at": self.built_at,
+                    "requests": self.requests}
+        if route == "/graph":
+            return list(self.graph)
+        if route == "/bfs":
+            return self._subgraph(params)
+        if route == "/topo":
+            return {"order": self.order, "acyclic": self.acyclic}
+        if route == "/deps":
+            return index.dependencies(_param(params, "node"))
+        if route == "/rdeps":
+            return index.dependents(_param(params, "node"))
+        if route == "/reaches":
+            return index.reaches(_param(params, "a"), _param(params, "b"))
+        if route == "/why":
+            return index.why(_param(params, "a"), _param(params, "b"))
+        return None
+
+    # -------------------------
+    # HTTP
+    # -------------------------
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    if header.lower().startswith(b"connection:") and b"close" in header.lower():
+                        keep_alive = False
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) < 2 or parts[0] != "GET":
+                    status, ctype, body = 405, "text/plain", b"only GET is supported"
+                else:
+                    status, ctype, body = self.handle(parts[1])
+
+                writer.write(
+                    "HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n"
+                    "Connection: {}\r\n\r\n".format(
+                        status, _REASONS.get(status, ""), ctype, len(body),
+                        "keep-alive" if keep_alive else "close"
+                    ).encode("latin-1") + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self._client, host, port)
+        print(f"Serving {self.graph.num_nodes} nodes / {self.graph.num_edges} edges "
+              f"on http://{host}:{port}")
+        if self._stamp is not None and self.refresh_interval > 0:
+            self._refresh_task = asyncio.create_task(self.refresh_loop())
+        async with server:
+            await server.serve_forever()
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def _param(params: dict, name: str) -> str:
+    if name not in params:
+        raise ValueError("missing parameter: " + name)
+    return params[name]
+
+
+def _json(value) -> bytes:
+    return json.dumps(value).encode("utf-8")
@@ -0,0 +1,131 @@
+"""
+snapshot.py - Stage 5 (Variant 27)
+
+Persisted graph snapshot for incremental rebuilds.
+
+For every node the snapshot stores a fingerprint of its manifest
+(commit hash, index file stamp, ...) and the dependencies it resolved
+to. On the next run nodes whose fingerprint did not change reuse the
+stored dependencies instead of calling the loader again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+
+
+def content_fingerprint(deps) -> str:
+    """Fallback fingerprint: hash of the dependency list itself."""
+    return hashlib.sha256("\n".join(deps).encode()).hexdigest()[:16]
+
+
+def diff_edges(old_edges, new_edges):
+    """Return (added, removed) edge lists, duplicates counted."""
+    old = Counter(map(tuple, old_edges))
+    new = Counter(map(tuple, new_edges))
+    return list((new - old).elements()), list((old - new).elements())
+
+
+class GraphSnapshot:
+    """
+    nodes: {name: {"hash": fingerprint, "deps": [names],
+                   "kinds": {dep: "dev" / "build"} (only if any),
+                   "choices": data of choices.record(name) (if any)}}
+    edges: edge list of the last build
+    order: topological order of the last build
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.nodes = {}
+        self.edges = []
+        self.order = []
+        self.reused = 0
+        self.resolved = 0
+        self._new_nodes = {}
+        self._lock = threading.Lock()
+
+        if self.path is not None and self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.nodes = data.get("nodes", {})
+            self.edges = [tuple(e) for e in data.get("edges", [])]
+            self.order = data.get("order", [])
+
+    def wrap(self, loader, fingerprint=None, edge_kind=None, choices=None):
+        """
+        Return a dependency_loader that answers unchanged nodes from
+        the snapshot. fingerprint(name) -> str must be cheaper than
+        loader(name); without it every node is re-resolved and only
+        the diff is incremental. With the source's edge_kind(src, dst),
+        dependency kinds are stored too and kept for reused nodes
+        (see GraphSnapshot.edge_kind). choices is an optional object
+        with record(name) -> JSON data and replay(name, data): what
+        loading a node decided for its children (the sparse index's
+        version requirements) is stored and replayed on reuse, so the
+        children resolve as in a full build.
+        """
+        def cached_loader(name):
+            old = self.nodes.get(name)
+            if (old is not None and fingerprint is not None
+                    and old["hash"] == fingerprint(name)):
+                deps = old["deps"]
+                kinds = old.get("kinds")
+                chosen = old.get("choices")
+                if choices is not None and chosen:
+                    choices.replay(name, chosen)
+                with self._lock:
+                    self.reused += 1
+                stamp = old["hash"]
+            else:
+                deps = list(loader(name))
+                # Stamped after loading: the loader may have taught the
+                # fingerprint where the node comes from
+                if fingerprint is not None:
+                    stamp = fingerprint(name)
+                else:
+                    stamp = content_fingerprint(deps)
+                chosen = choices.record(name) if choices is not None else None
+                kinds = None
+                if edge_kind is not None:
+                    kinds = {dep: edge_kind(name, dep) for dep in deps}
+                    kinds = {dep: k for dep, k in kinds.items() if k != "normal"}
+                with self._lock:
+                    self.resolved += 1
+
+            entry = {"hash": stamp, "deps": deps}
+            if kinds:
+                entry["kinds"] = kinds
+            if chosen:
+                entry["choices"] = chosen
+            with self._lock:
+                self._new_nodes[name] = entry
+            return deps
+        return cached_loader
+
+    def edge_kind(self, src, dst) -> str:
+        """Dependency kind of an edge of the current (or last) build."""
+        entry = self._new_nodes.get(src) or self.nodes.get(src) or {}
+        return entry.get("kinds", {}).get(dst, "normal")
+
+    def update(self, edges, order):
+        """
+        Replace the snapshot contents with the new build.
+        Returns (added, removed) edges compared to the previous build.
+        """
+        added, removed = diff_edges(self.edges, edges)
+        self.nodes = self._new_nodes
+        self._new_nodes = {}
+        self.edges = [tuple(e) for e in edges]
+        self.order = list(order)
+        return added, removed
+
+    def save(self):
+        data = {"nodes": self.nodes, "edges": self.edges, "order": self.order}
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
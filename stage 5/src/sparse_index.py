@@ -0,0 +1,230 @@
+"""
+sparse_index.py - Stage 5 (Variant 27)
+
+Dependency loader backed by a local mirror of the crates.io sparse
+index (one newline-delimited JSON file per crate, laid out as
+1/a, 2/ab, 3/a/abc and ab/cd/abcd...).
+
+Crate files are read lazily and kept in a small LRU, so the index can
+hold tens of thousands of crates without being loaded into memory.
+"""
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+DEFAULT_LRU_SIZE = 4096
+
+
+# -------------------------
+# SEMVER
+# -------------------------
+
+_VERSION_RE = re.compile(r"^(\d+)(?:\.(\d+|\*|x))?(?:\.(\d+|\*|x))?(?:-([0-9A-Za-z.-]+))?(?:\+.*)?$")
+
+
+def parse_version(text: str):
+    """'1.2.3-beta' -> (1, 2, 3, 'beta'); missing parts are None."""
+    m = _VERSION_RE.match(text.strip())
+    if not m:
+        raise ValueError("Invalid version: {}".format(text))
+    parts = [int(p) if p is not None and p.isdigit() else None for p in m.groups()[:3]]
+    return parts[0], parts[1], parts[2], m.group(4)
+
+
+def _key(version):
+    """Sort key: a pre-release sorts before its release."""
+    major, minor, patch, pre = version
+    return (major, minor or 0, patch or 0, pre is None, pre or "")
+
+
+def _comparator_matches(comp: str, version) -> bool:
+    comp = comp.strip()
+    if comp in ("", "*"):
+        return True
+
+    m = re.match(r"^(>=|<=|>|<|=|\^|~)?\s*(.*)$", comp)
+    op = m.group(1) or "^"
+    major, minor, patch, pre = parse_version(m.group(2))
+    v = _key(version)
+    lower = (major, minor or 0, patch or 0, pre is None, pre or "")
+    # Highest key still inside a partial version ("1.2" covers 1.2.*)
+    inside = (major, minor if minor is not None else 1 << 30,
+              patch if patch is not None else 1 << 30, True, "")
+
+    if op == "=":
+        if minor is None:
+            return version[0] == major
+        if patch is None:
+            return version[:2] == (major, minor)
+        return v == lower
+    if op == ">":
+        return v > inside
+    if op == ">=":
+        return v >= lower
+    if op == "<":
+        return v < lower
+    if op == "<=":
+        return v <= inside
+
+    # Upper bound for caret / tilde requirements
+    if op == "~":
+        upper = (major + 1, 0, 0) if minor is None else (major, minor + 1, 0)
+    elif major > 0 or minor is None:
+        upper = (major + 1, 0, 0)
+    elif minor > 0 or patch is None:
+        upper = (0, minor + 1, 0)
+    else:
+        upper = (0, 0, patch + 1)
+    return lower <= v < (upper[0], upper[1], upper[2], False, "")
+
+
+def matches(req: str, version: str) -> bool:
+    """True if version satisfies a Cargo requirement like '^1.2, <1.5'."""
+    parsed = parse_version(version)
+    if parsed[3] is not None and "-" not in req:
+        # Pre-releases only match requirements that name one
+        return False
+    return all(_comparator_matches(c, parsed) for c in req.split(","))
+
+
+# -------------------------
+# INDEX
+# -------------------------
+
+def index_path(name: str) -> Path:
+    """Relative path of a crate file in the sparse index layout."""
+    name = name.lower()
+    if len(name) == 1:
+        return Path("1") / name
+    if len(name) == 2:
+        return Path("2") / name
+    if len(name) == 3:
+        return Path("3") / name[0] / name
+    return Path(name[:2]) / name[2:4] / name
+
+
+class SparseIndex:
+    """
+    Reader for a local sparse index directory.
+
+    Versions are chosen once per crate: the first requirement that
+    reaches a crate decides its version (the highest non-yanked one
+    matching), and later lookups of that crate reuse it.
+    """
+
+    def __init__(self, root, lru_size: int = DEFAULT_LRU_SIZE,
+                 kinds=("normal", "build")):
+        self.root = Path(root)
+        if not self.root.is_dir():
+            raise FileNotFoundError("Sparse index directory not found: {}".format(root))
+        self.lru_size = lru_size
+        self.kinds = kinds
+        self.selected = {}
+        self.pinned = {}
+        self.requirements = {}    # name -> {crate: req} of its loaded entry
+        self.edge_kinds = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def entries(self, name: str):
+        """All index lines of a crate as dicts, [] for unknown crates."""
+        with self._lock:
+            if name in self._cache:
+                self._cache.move_to_end(name)
+                return self._cache[name]
+
+        path = self.root / index_path(name)
+        entries = []
+        if path.exists():
+            with path.open("r", encoding="utf-8") as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+
+        with self._lock:
+            self._cache[name] = entries
+            if len(self._cache) > self.lru_size:
+                self._cache.popitem(last=False)
+        return entries
+
+    def select(self, name: str, req: str = "*"):
+        """Highest non-yanked entry of a crate matching req, or None."""
+        best = None
+        for entry in self.entries(name):
+            if entry.get("yanked") or not matches(req, entry["vers"]):
+                continue
+            if best is None or _key(parse_version(entry["vers"])) > _key(parse_version(best["vers"])):
+                best = entry
+        return best
+
+    def pin(self, name: str, version: str):
+        """Force the version used for a crate (e.g. the root package)."""
+        with self._lock:
+            self.pinned[name] = version
+            self.selected[name] = version
+
+    def fingerprint(self, name: str) -> str:
+        """
+        Cheap change stamp: selected version plus index file mtime/size.
+
+        The version is the one the requirements reaching the crate
+        selected (replayed for parents answered from a snapshot, see
+        replay), so a changed requirement or index file re-resolves it.
+        """
+        with self._lock:
+            version = self.selected.get(name)
+        try:
+            st = (self.root / index_path(name)).stat()
+        except OSError:
+            return "{}:missing".format(version)
+        return "{}:{}:{}".format(version, st.st_mtime_ns, st.st_size)
+
+    def record(self, name: str):
+        """Requirements of a loaded crate's dependencies, for the snapshot."""
+        return self.requirements.get(name)
+
+    def replay(self, name: str, requirements: dict):
+        """Select versions for the dependencies of a crate reused from a snapshot."""
+        for crate, req in requirements.items():
+            chosen = self.select(crate, req)
+            if chosen is not None:
+                with self._lock:
+                    self.selected.setdefault(crate, chosen["vers"])
+
+    def _record_kind(self, name: str, crate: str, kind: str):
+        # A crate that is also a normal dependency is drawn as one
+        with self._lock:
+            if kind == "normal" or (name, crate) not in self.edge_kinds:
+                self.edge_kinds[(name, crate)] = kind
+
+    def edge_kind(self, src: str, dst: str) -> str:
+        """Dependency kind of an edge seen by the loader ("normal" if unknown)."""
+        return self.edge_kinds.get((src, dst), "normal")
+
+    def loader(self, name: str):
+        """dependency_loader for build_bfs_graph."""
+        with self._lock:
+            version = self.selected.get(name)
+        entry = self.select(name, "=" + version if version else "*")
+        if entry is None:
+            return []
+
+        with self._lock:
+            self.selected.setdefault(name, entry["vers"])
+
+        deps = []
+        requirements = {}
+        for dep in entry.get("deps", []):
+            if dep.get("optional") or (dep.get("kind") or "normal") not in self.kinds:
+                continue
+            crate = dep.get("package") or dep["name"]
+            self._record_kind(name, crate, dep.get("kind") or "normal")
+            requirements.setdefault(crate, dep.get("req", "*"))
+            if crate not in deps:
+                deps.append(crate)
+        self.replay(name, requirements)
+        with self._lock:
+            self.requirements[name] = requirements
+        return deps
@@ -0,0 +1,113 @@
+"""
+summarize.py - Stage 5 (Variant 27)
+
+Smaller views of a big dependency graph for D2 export and rendering.
+
+Modes (all take and return (src, dst) edge lists):
+- k_hop: the crates within k edges of one crate
+- transitive_reduction: drop edges implied by a longer path (topo_sort)
+- collapse_sccs: one node per strongly connected component
+- top_fan_in: the N crates with the most dependents
+
+Repeated edges are dropped first, so the modes can be chained.
+"""
+
+import heapq
+from collections import deque
+
+from topo_sort import as_graph, condense, transitive_reduction
+
+
+SUMMARY_MODES = ("khop", "reduce", "collapse", "top")
+DIRECTIONS = ("out", "in", "both")
+
+
+def _unique(edges):
+    return list(dict.fromkeys(edges))
+
+
+def _induced(edges, keep):
+    return [(s, t) for s, t in edges if s in keep and t in keep]
+
+
+def k_hop(edges, node, k: int, direction: str = "both"):
+    """
+    Edges between the crates at most k edges away from node:
+    following dependencies ("out"), dependents ("in") or both.
+    Raises KeyError for an unknown crate.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown direction: {direction!r} (expected one of {DIRECTIONS})")
+
+    edges = _unique(edges)
+    graph = as_graph(edges)
+    if node not in graph.ids:
+        raise KeyError("Unknown crate: {}".format(node))
+
+    walks = []
+    if direction in ("out", "both"):
+        walks.append(graph)
+    if direction in ("in", "both"):
+        walks.append(graph.reversed())
+
+    start = graph.node_id(node)
+    dist = {start: 0}
+    queue = deque([start])
+    while queue:
+        v = queue.popleft()
+        if dist[v] == k:
+            continue
+        for g in walks:
+            for w in g.successors(v):
+                if w not in dist:
+                    dist[w] = dist[v] + 1
+                    queue.append(w)
+
+    names = graph.names
+    return _induced(edges, {names[v] for v in dist})
+
+
+def component_label(component) -> str:
+    """Node name for a collapsed component: the crate, or a short cycle label."""
+    if len(component) == 1:
+        return component[0]
+    shown = ", ".join(component[:3])
+    more = f", +{len(component) - 3}" if len(component) > 3 else ""
+    return f"[cycle] {shown}{more}"
+
+
+def collapse_sccs(edges):
+    """
+    Condensed graph: every strongly connected component becomes one
+    node (see component_label), with one edge per pair of components.
+    """
+    components, _, dag = condense(_unique(edges))
+    labels = [component_label(comp) for comp in components]
+    return [(labels[a], labels[b]) for a, b in dag.edge_ids()]
+
+
+def top_fan_in(edges, n: int):
+    """
+    Edges between the n crates with the most direct dependents
+    (ties: the crate seen first wins).
+    """
+    edges = _unique(edges)
+    graph = as_graph(edges)
+    fan_in = graph.in_degree()
+    top = heapq.nlargest(n, range(graph.num_nodes), key=lambda v: (fan_in[v], -v))
+    names = graph.names
+    return _induced(edges, {names[v] for v in top})
+
+
+def summarize(edges, mode: str, node=None, hops: int = 2, top: int = 50,
+              direction: str = "both"):
+    """Apply one summary mode (see SUMMARY_MODES)."""
+    if mode == "khop":
+        return k_hop(edges, node, hops, direction)
+    if mode == "reduce":
+        return transitive_reduction(edges)
+    if mode == "collapse":
+        return collapse_sccs(edges)
+    if mode == "top":
+        return top_fan_in(edges, top)
+    raise ValueError(f"Unknown summary mode: {mode!r} (expected one of {SUMMARY_MODES})")
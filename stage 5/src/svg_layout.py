@@ -0,0 +1,226 @@
+"""
+svg_layout.py - Stage 5 (Variant 27)
+
+Built-in layered (Sugiyama-style) layout that writes SVG directly,
+used when the `d2` binary is not installed.
+
+Steps:
+1. cycle removal: edges closing a cycle in a DFS are drawn reversed
+2. layering: longest path from the crates nothing depends on
+3. edges spanning several layers get dummy nodes, one per layer
+4. ordering: barycenter sweeps down and up to reduce crossings
+5. coordinates: nodes side by side in each layer, layers centered
+"""
+
+from xml.sax.saxutils import escape
+
+from topo_sort import as_graph
+
+
+SWEEPS = 8
+CHAR_WIDTH = 7.5
+NODE_HEIGHT = 32
+NODE_PADDING = 20
+H_GAP = 24
+LAYER_GAP = 72
+MARGIN = 20
+DUMMY_WIDTH = 8
+
+EDGE_DASHES = {"dev": "3,3", "build": "6,4"}
+
+
+def _acyclic_edges(graph):
+    """
+    Edge ids with DFS back edges reversed (self-loops and repeated
+    edges dropped). Returns a list of (s, t, reversed).
+    """
+    n = graph.num_nodes
+    offsets = graph.offsets
+    targets = graph.targets
+    state = bytearray(n)  # 0 new, 1 on stack, 2 done
+    seen = set()
+    out = []
+
+    for start in range(n):
+        if state[start]:
+            continue
+        state[start] = 1
+        stack = [(start, offsets[start])]
+        while stack:
+            v, k = stack[-1]
+            if k == offsets[v + 1]:
+                state[v] = 2
+                stack.pop()
+                continue
+            stack[-1] = (v, k + 1)
+            w = targets[k]
+            if w == v or (v, w) in seen:
+                continue
+            seen.add((v, w))
+            if state[w] == 1:
+                out.append((w, v, True))
+                continue
+            out.append((v, w, False))
+            if state[w] == 0:
+                state[w] = 1
+                stack.append((w, offsets[w]))
+    return out
+
+
+def _layers(n, edges):
+    """Longest-path layer of every node over acyclic (s, t) edges."""
+    succ = [[] for _ in range(n)]
+    indeg = [0] * n
+    for s, t, _ in edges:
+        succ[s].append(t)
+        indeg[t] += 1
+
+    layer = [0] * n
+    ready = [v for v in range(n) if indeg[v] == 0]
+    while ready:
+        v = ready.pop()
+        for w in succ[v]:
+            layer[w] = max(layer[w], layer[v] + 1)
+            indeg[w] -= 1
+            if indeg[w] == 0:
+                ready.append(w)
+    return layer
+
+
+def _order(layers, succ, pred):
+    """Barycenter sweeps; layers is a list of node lists, reordered in place."""
+    def sweep(rows, neighbours):
+        for i in range(1, len(rows)):
+            pos = {v: k for k, v in enumerate(rows[i - 1])}
+
+            def barycenter(v, k):
+                near = [pos[u] for u in neighbours[v] if u in pos]
+                return (sum(near) / len(near) if near else k, k)
+
+            keys = {v: barycenter(v, k) for k, v in enumerate(rows[i])}
+            rows[i].sort(key=keys.__getitem__)
+
+    for i in range(SWEEPS):
+        if i % 2 == 0:
+            sweep(layers, pred)
+        else:
+            layers.reverse()
+            sweep(layers, succ)
+            layers.reverse()
+
+
+def layout(edges):
+    """
+    Layered layout of a graph.
+
+    Returns (nodes, routes, width, height):
+    - nodes: {name: (x, y, width)} with (x, y) the center
+    - routes: [(src, dst, [(x, y), ...])] one polyline per edge,
+      from the bottom of src to the top of dst
+    """
+    graph = as_graph(edges)
+    names = graph.names
+    n = graph.num_nodes
+
+    acyclic = _acyclic_edges(graph)
+    layer = _layers(n, acyclic)
+
+    # Split long edges with dummy nodes (ids n, n + 1, ...)
+    width = [len(str(name)) * CHAR_WIDTH + 2 * NODE_PADDING for name in names]
+    succ = [[] for _ in range(n)]
+    pred = [[] for _ in range(n)]
+    chains = []
+    for s, t, flipped in acyclic:
+        chain = [s]
+        for depth in range(layer[s] + 1, layer[t]):
+            dummy = len(layer)
+            layer.append(depth)
+            width.append(DUMMY_WIDTH)
+            succ.append([])
+            pred.append([])
+            chain.append(dummy)
+        chain.append(t)
+        for a, b in zip(chain, chain[1:]):
+            succ[a].append(b)
+            pred[b].append(a)
+        chains.append(chain[::-1] if flipped else chain)
+
+    rows = [[] for _ in range(max(layer, default=-1) + 1)]
+    for v in range(len(layer)):
+        rows[layer[v]].append(v)
+    _order(rows, succ, pred)
+
+    row_widths = [sum(width[v] for v in row) + H_GAP * (len(row) - 1) for row in rows]
+    total_width = max(row_widths, default=0) + 2 * MARGIN
+    total_height = max(len(rows) * (NODE_HEIGHT + LAYER_GAP) - LAYER_GAP, 0) + 2 * MARGIN
+
+    x = [0.0] * len(layer)
+    y = [0.0] * len(layer)
+    for i, row in enumerate(rows):
+        cursor = (total_width - row_widths[i]) / 2
+        for v in row:
+            x[v] = cursor + width[v] / 2
+            y[v] = MARGIN + i * (NODE_HEIGHT + LAYER_GAP) + NODE_HEIGHT / 2
+            cursor += width[v] + H_GAP
+
+    nodes = {names[v]: (x[v], y[v], width[v]) for v in range(n)}
+
+    routes = []
+    half = NODE_HEIGHT / 2
+    for chain in chains:
+        src, dst = chain[0], chain[-1]
+        down = layer[dst] > layer[src]
+        points = [(x[src], y[src] + (half if down else -half))]
+        points += [(x[v], y[v]) for v in chain[1:-1]]
+        points.append((x[dst], y[dst] - (half if down else -half)))
+        routes.append((names[src], names[dst], points))
+
+    # Self-loops: a small arc on the right side of the node
+    for s in {s for s, t in graph.edge_ids() if s == t}:
+        right = x[s] + width[s] / 2
+        routes.append((names[s], names[s], [
+            (right, y[s] - 6), (right + 18, y[s] - 12),
+            (right + 18, y[s] + 12), (right, y[s] + 6),
+        ]))
+        total_width = max(total_width, right + 18 + MARGIN)
+
+    return nodes, routes, total_width, total_height
+
+
+def render_svg(edges, title=None, edge_kinds=None) -> str:
+    """
+    SVG text of the layered layout.
+    edge_kinds: optional {(src, dst): "dev" / "build"} for dashed edges.
+    """
+    nodes, routes, width, height = layout(edges)
+    edge_kinds = edge_kinds or {}
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" '
+        f'height="{height:.0f}" viewBox="0 0 {width:.0f} {height:.0f}" '
+        f'font-family="sans-serif" font-size="13">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" '
+        'markerWidth="8" markerHeight="8" orient="auto-start-reverse">'
+        '<path d="M 0 0 L 10 5 L 0 10 z" fill="#555"/></marker></defs>',
+    ]
+    if title:
+        out.append(f"<title>{escape(str(title))}</title>")
+
+    for src, dst, points in routes:
+        path = " ".join(f"{px:.1f},{py:.1f}" for px, py in points)
+        dash = EDGE_DASHES.get(edge_kinds.get((src, dst)))
+        extra = f' stroke-dasharray="{dash}"' if dash else ""
+        out.append(f'<polyline points="{path}" fill="none" stroke="#555" '
+                   f'stroke-width="1.2" marker-end="url(#arrow)"{extra}/>')
+
+    for name, (cx, cy, w) in nodes.items():
+        label = escape(str(name))
+        out.append(
+            f'<g><rect x="{cx - w / 2:.1f}" y="{cy - NODE_HEIGHT / 2:.1f}" '
+            f'width="{w:.1f}" height="{NODE_HEIGHT}" rx="6" fill="#edf0fd" '
+            f'stroke="#0d32b2"/><text x="{cx:.1f}" y="{cy + 4:.1f}" '
+            f'text-anchor="middle">{label}</text></g>'
+        )
+
+    out.append("</svg>")
+    return "\n".join(out)
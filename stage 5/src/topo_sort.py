@@ -3,62 +3,556 @@ topo_sort.py - Stage 4 (Variant 27)
 
 Implements:
 - Topological sorting of the dependency graph
+- Dynamic topological order (Pearce-Kelly) for edge insertions/deletions
+- Strongly connected components / condensation (cycle reporting)
+- Transitive reduction over the condensation
+- Layered build schedule with critical path
 - Comparison between our order and the real Cargo order
 """
 
-from collections import defaultdict, deque
+import bisect
+import hashlib
+import heapq
+from array import array
+from collections import deque
 
-def topological_sort(edges):
+from graph import Graph
+
+
+def as_graph(edges) -> Graph:
+    """Accept a Graph or a list of (src, dst) and return a Graph."""
+    if isinstance(edges, Graph):
+        return edges
+    return Graph.from_edges(edges)
+
+
+TIE_BREAKS = (None, "discovery", "name")
+
+
+def topological_sort(edges, tie_break=None):
     """
-    edges: list of (src, dst)
+    edges: Graph or list of (src, dst)
+    tie_break: how to choose among nodes that are ready at the same time
+      None        - FIFO queue (plain Kahn, O(V+E))
+      "discovery" - smallest node id first, i.e. BFS discovery order;
+                    independent of the order of each node's edges
+      "name"      - smallest name first; depends only on the edge set,
+                    so the output is identical across runs and processes
+      Both heap modes are O((V+E) log V).
     returns: list of nodes in topologically sorted order
     """
+    if tie_break not in TIE_BREAKS:
+        raise ValueError("Unknown tie_break: {}".format(tie_break))
 
-    graph = defaultdict(list)
-    indegree = defaultdict(int)
+    graph = as_graph(edges)
+    indegree = graph.in_degree()
+    offsets = graph.offsets
+    targets = graph.targets
+    names = graph.names
 
-    nodes = set()
+    if tie_break is None:
+        # Queue of all nodes with no incoming edges
+        queue = deque(i for i in range(graph.num_nodes) if indegree[i] == 0)
+        pop = queue.popleft
+        push = queue.append
+    else:
+        if tie_break == "name":
+            ranked = sorted(range(graph.num_nodes), key=lambda i: str(names[i]))
+            rank = array("i", [0]) * graph.num_nodes
+            for r, i in enumerate(ranked):
+                rank[i] = r
+        else:
+            rank = range(graph.num_nodes)
 
-    for src, dst in edges:
-        graph[src].append(dst)
-        indegree[dst] += 1
-        nodes.add(src)
-        nodes.add(dst)
+        # Heap of (rank, id) for all nodes with no incoming edges
+        queue = [(rank[i], i) for i in range(graph.num_nodes) if indegree[i] == 0]
+        heapq.heapify(queue)
 
-    # Queue of all nodes with no incoming edges
-    queue = deque([n for n in nodes if indegree[n] == 0])
+        def pop():
+            return heapq.heappop(queue)[1]
+
+        def push(i):
+            heapq.heappush(queue, (rank[i], i))
 
     order = []
 
     while queue:
-        node = queue.popleft()
+        node = pop()
         order.append(node)
 
-        for neigh in graph[node]:
+        for k in range(offsets[node], offsets[node + 1]):
+            neigh = targets[k]
             indegree[neigh] -= 1
             if indegree[neigh] == 0:
-                queue.append(neigh)
+                push(neigh)
+
+    order = [names[i] for i in order]
 
-    if len(order) != len(nodes):
+    if len(order) != graph.num_nodes:
         # Graph contains cycles or unresolved edges
         return order, False
 
     return order, True
 
 
-def compare_with_cargo(our_order, cargo_order):
+def order_digest(order) -> str:
+    """SHA-256 of an order, for caching / byte-comparing outputs."""
+    return hashlib.sha256("\n".join(map(str, order)).encode("utf-8")).hexdigest()
+
+
+def _tarjan(graph: Graph):
     """
-    Compare two lists and return elements that differ.
-    Returns a dict with results.
+    Iterative Tarjan SCC over the CSR arrays.
+    Returns components as lists of node ids, in reverse topological order.
     """
+    n = graph.num_nodes
+    offsets = graph.offsets
+    targets = graph.targets
 
-    differences = []
+    index = array("i", [-1]) * n
+    low = array("i", [0]) * n
+    on_stack = bytearray(n)
+    stack = []
+    components = []
+    counter = 0
 
-    for i, node in enumerate(our_order):
-        if i >= len(cargo_order):
-            differences.append((node, None))
+    for start in range(n):
+        if index[start] != -1:
             continue
-        if node != cargo_order[i]:
-            differences.append((node, cargo_order[i]))
 
-    return differences
+        # Call stack of (node, next edge position)
+        work = [(start, offsets[start])]
+        index[start] = low[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack[start] = 1
+
+        while work:
+            node, k = work[-1]
+            if k < offsets[node + 1]:
+                work[-1] = (node, k + 1)
+                neigh = targets[k]
+                if index[neigh] == -1:
+                    index[neigh] = low[neigh] = counter
+                    counter += 1
+                    stack.append(neigh)
+                    on_stack[neigh] = 1
+                    work.append((neigh, offsets[neigh]))
+                elif on_stack[neigh] and index[neigh] < low[node]:
+                    low[node] = index[neigh]
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+def strongly_connected_components(edges):
+    """
+    edges: Graph or list of (src, dst)
+    returns: list of components (lists of node names), ordered so that
+    every edge goes from an earlier or the same component to a later one
+    """
+    graph = as_graph(edges)
+    names = graph.names
+    return [[names[i] for i in sorted(comp)] for comp in reversed(_tarjan(graph))]
+
+
+def condense(edges):
+    """
+    Condensation of the graph in one linear pass.
+
+    Returns (components, component_of, dag):
+    - components: lists of node names, topologically ordered
+    - component_of: {node name: component index}
+    - dag: Graph over component indices 0..k-1, no duplicate edges
+    """
+    graph = as_graph(edges)
+    comps = [sorted(comp) for comp in reversed(_tarjan(graph))]
+
+    comp_of = array("i", [0]) * graph.num_nodes
+    for c, comp in enumerate(comps):
+        for i in comp:
+            comp_of[i] = c
+
+    dag_edges = []
+    seen = set()
+    for s, t in graph.edge_ids():
+        a, b = comp_of[s], comp_of[t]
+        if a != b and (a, b) not in seen:
+            seen.add((a, b))
+            dag_edges.append((a, b))
+
+    names = graph.names
+    components = [[names[i] for i in comp] for comp in comps]
+    component_of = {names[i]: comp_of[i] for i in range(graph.num_nodes)}
+    return components, component_of, Graph.from_edges(dag_edges, nodes=range(len(comps)))
+
+
+def transitive_reduction(edges):
+    """
+    Drop every edge A -> C that is implied by a longer path A -> ... -> C.
+
+    Runs on the condensation, so cycles are allowed: edges inside a
+    strongly connected component are all kept, and between two
+    components at most one edge (the first one) is kept.
+
+    Components are visited in reverse topological order, each with a
+    bitset (a Python int) of every component it reaches. A component's
+    successors are checked nearest first (lowest topological index):
+    only an earlier successor can reach a later one, so a successor
+    already in the union of the kept ones' bitsets is implied and
+    dropped. One bit test per DAG edge, one OR per kept edge.
+
+    Returns the kept (src, dst) edges in their original order.
+    """
+    if not isinstance(edges, Graph):
+        edges = list(edges)
+    graph = as_graph(edges)
+    components, component_of, dag = condense(graph)
+
+    reach = [0] * len(components)
+    kept = set()
+    for c in range(len(components) - 1, -1, -1):
+        covered = 0
+        for d in sorted(dag.successors(c)):
+            if not covered >> d & 1:
+                kept.add((c, d))
+                covered |= reach[d]
+        reach[c] = covered | 1 << c
+
+    out = []
+    for src, dst in dict.fromkeys(edges):
+        pair = (component_of[src], component_of[dst])
+        if pair[0] == pair[1]:
+            out.append((src, dst))
+        elif pair in kept:
+            kept.discard(pair)
+            out.append((src, dst))
+    return out
+
+
+def find_cycles(edges, components=None):
+    """
+    Components that form cycles: size > 1 or a node with a self-loop.
+    Pass the result of strongly_connected_components to avoid a second pass.
+    """
+    graph = as_graph(edges)
+    if components is None:
+        components = strongly_connected_components(graph)
+    self_loops = {graph.names[s] for s, t in graph.edge_ids() if s == t}
+    return [comp for comp in components
+            if len(comp) > 1 or comp[0] in self_loops]
+
+
+class CycleError(ValueError):
+    """Raised when an edge would close a cycle; .cycle lists its nodes."""
+
+    def __init__(self, cycle):
+        super().__init__("Cycle detected: {}".format(" -> ".join(map(str, cycle))))
+        self.cycle = cycle
+
+
+class DynamicTopologicalOrder:
+    """
+    Topological order kept valid under edge insertions and deletions
+    (Pearce & Kelly, 2006).
+
+    Inserting an edge that already points forward is O(1). Otherwise
+    only the nodes between its endpoints in the current order are
+    visited and reordered. Deleting an edge never invalidates the order.
+    """
+
+    def __init__(self, nodes=()):
+        self._pos = {}
+        self._at = []
+        self._out = {}
+        self._in = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @classmethod
+    def from_edges(cls, edges, order=None):
+        """
+        Build from an edge list. `order` may give a (possibly stale)
+        starting order; edges against it are repaired on insertion.
+        Raises CycleError if the edges contain a cycle.
+        """
+        graph = as_graph(edges)
+        if order is None:
+            order, ok = topological_sort(graph)
+            if not ok:
+                raise CycleError(sorted(set(graph.names) - set(order)))
+        dto = cls(n for n in order if n in graph.ids)
+        for name in graph.names:
+            dto.add_node(name)
+        for src, dst in graph:
+            dto.add_edge(src, dst)
+        return dto
+
+    def __len__(self):
+        return len(self._at)
+
+    def __contains__(self, node):
+        return node in self._pos
+
+    def order(self):
+        return list(self._at)
+
+    def position(self, node) -> int:
+        return self._pos[node]
+
+    def add_node(self, node):
+        if node not in self._pos:
+            self._pos[node] = len(self._at)
+            self._at.append(node)
+            self._out[node] = {}
+            self._in[node] = {}
+
+    def add_edge(self, src, dst):
+        """Insert src -> dst, raising CycleError if it closes a cycle."""
+        if src == dst:
+            raise CycleError([src, dst])
+        self.add_node(src)
+        self.add_node(dst)
+
+        lower, upper = self._pos[dst], self._pos[src]
+        if lower < upper:
+            forward = self._reach(dst, self._out, lambda p: p <= upper, src)
+            backward = self._reach(src, self._in, lambda p: p >= lower)
+            self._reorder(forward, backward)
+
+        out = self._out[src]
+        out[dst] = out.get(dst, 0) + 1
+        inc = self._in[dst]
+        inc[src] = inc.get(src, 0) + 1
+
+    def remove_edge(self, src, dst):
+        """Delete one src -> dst edge; the order stays valid."""
+        out = self._out[src]
+        if out.get(dst, 0) == 0:
+            raise KeyError("No edge {} -> {}".format(src, dst))
+        out[dst] -= 1
+        self._in[dst][src] -= 1
+        if out[dst] == 0:
+            del out[dst]
+            del self._in[dst][src]
+
+    def _reach(self, start, adjacency, inside, target=None):
+        """
+        Iterative DFS from start over nodes whose position satisfies
+        inside(). Hitting target means the new edge closes a cycle.
+        """
+        seen = {start}
+        parent = {start: None}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neigh in adjacency[node]:
+                if neigh == target:
+                    path = [node]
+                    while parent[node] is not None:
+                        node = parent[node]
+                        path.append(node)
+                    raise CycleError([target] + path[::-1] + [target])
+                if neigh not in seen and inside(self._pos[neigh]):
+                    seen.add(neigh)
+                    parent[neigh] = node
+                    stack.append(neigh)
+        return seen
+
+    def _reorder(self, forward, backward):
+        """Move `backward` nodes before `forward` nodes, reusing their slots."""
+        pos = self._pos
+        backward = sorted(backward, key=pos.__getitem__)
+        forward = sorted(forward, key=pos.__getitem__)
+        slots = sorted(pos[n] for n in backward + forward)
+        for slot, node in zip(slots, backward + forward):
+            pos[node] = slot
+            self._at[slot] = node
+
+
+def patch_topological_order(previous_order, edges):
+    """
+    Reuse the order of a previous build for an updated graph.
+
+    Removed nodes are dropped and new nodes appended, then the edges
+    are inserted into a DynamicTopologicalOrder seeded with that order,
+    so only edges that now point backwards cause local reordering.
+    Falls back to a full sort if the new graph has a cycle.
+    """
+    graph = as_graph(edges)
+    try:
+        return DynamicTopologicalOrder.from_edges(graph, previous_order).order(), True
+    except CycleError:
+        return topological_sort(graph)
+
+
+def build_schedule(edges, costs=None):
+    """
+    Parallel build schedule: an edge A -> B means A needs B built first.
+
+    Layer 0 holds crates without dependencies, layer k crates whose
+    dependencies are all in earlier layers; crates in one layer can be
+    built in parallel. The critical path is the chain with the largest
+    total cost (costs: {crate: estimate}, default 1 per crate).
+    Linear time. Raises CycleError if the graph has a cycle.
+
+    Returns a dict with "layers", "depth" (number of layers, the
+    unweighted critical path length), "critical_path" (root first)
+    and "critical_path_cost".
+    """
+    graph = as_graph(edges)
+    n = graph.num_nodes
+    names = graph.names
+    offsets = graph.offsets
+    targets = graph.targets
+    dependents = graph.reversed()
+
+    cost = [1.0] * n
+    if costs:
+        for i, name in enumerate(names):
+            cost[i] = float(costs.get(name, 1.0))
+
+    pending = graph.out_degree()
+    layer = [i for i in range(n) if pending[i] == 0]
+    layers = []
+    finish = [0.0] * n
+    best_dep = array("i", [-1]) * n
+    done = 0
+
+    while layer:
+        layers.append(layer)
+        next_layer = []
+        for node in layer:
+            done += 1
+            # Dependencies are all finished: pick the slowest one
+            longest = 0.0
+            best = -1
+            for k in range(offsets[node], offsets[node + 1]):
+                dep = targets[k]
+                if best == -1 or finish[dep] > longest:
+                    longest = finish[dep]
+                    best = dep
+            finish[node] = cost[node] + longest
+            best_dep[node] = best
+
+            for parent in dependents.successors(node):
+                pending[parent] -= 1
+                if pending[parent] == 0:
+                    next_layer.append(parent)
+        layer = next_layer
+
+    if done != n:
+        raise CycleError(find_cycles(graph)[0])
+
+    path = []
+    if n:
+        node = max(range(n), key=finish.__getitem__)
+        while node != -1:
+            path.append(names[node])
+            node = best_dep[node]
+
+    return {
+        "layers": [[names[i] for i in lay] for lay in layers],
+        "depth": len(layers),
+        "critical_path": path,
+        "critical_path_cost": max(finish) if n else 0.0
+    }
+
+
+def longest_increasing_subsequence(values):
+    """Indices of one longest strictly increasing subsequence, O(n log n)."""
+    tails = []          # tails[k]: index of the smallest tail of length k+1
+    tail_values = []
+    previous = [-1] * len(values)
+    for i, v in enumerate(values):
+        k = bisect.bisect_left(tail_values, v)
+        if k:
+            previous[i] = tails[k - 1]
+        if k == len(tails):
+            tails.append(i)
+            tail_values.append(v)
+        else:
+            tails[k] = i
+            tail_values[k] = v
+
+    result = []
+    i = tails[-1] if tails else -1
+    while i != -1:
+        result.append(i)
+        i = previous[i]
+    return result[::-1]
+
+
+def _dependency_pairs(graph: Graph, keep):
+    """
+    Yield (u, v) for nodes u, v in keep with a path u -> v whose inner
+    nodes are not in keep. Every path between kept nodes is a chain of
+    such pairs, so checking them checks all paths.
+    """
+    ids = graph.ids
+    names = graph.names
+    keep_ids = {ids[n] for n in keep if n in ids}
+    for u in keep_ids:
+        seen = {u}
+        stack = list(graph.successors(u))
+        while stack:
+            v = stack.pop()
+            if v in seen:
+                continue
+            seen.add(v)
+            if v in keep_ids:
+                yield names[u], names[v]
+            else:
+                stack.extend(graph.successors(v))
+
+
+def compare_with_cargo(our_order, cargo_order, edges=None):
+    """
+    Compare our order with Cargo's (both in the same direction).
+
+    Returns a dict with results:
+    - "moved": smallest set of crates whose move turns Cargo's order into
+      ours (everything outside a longest common subsequence, O(n log n))
+    - "violations": pairs (a, b) connected by a dependency path a -> b
+      that the two orders place differently; needs `edges`
+    - "only_ours" / "only_cargo": crates missing from the other order
+    """
+    cargo_pos = {}
+    for i, node in enumerate(cargo_order):
+        cargo_pos.setdefault(node, i)
+    our_pos = {}
+    for i, node in enumerate(our_order):
+        our_pos.setdefault(node, i)
+
+    common = [n for n in our_pos if n in cargo_pos]
+    positions = [cargo_pos[n] for n in common]
+    in_lcs = {common[i] for i in longest_increasing_subsequence(positions)}
+
+    violations = []
+    if edges is not None:
+        for u, v in _dependency_pairs(as_graph(edges), common):
+            if (our_pos[u] < our_pos[v]) != (cargo_pos[u] < cargo_pos[v]):
+                violations.append((u, v))
+
+    return {
+        "moved": [n for n in common if n not in in_lcs],
+        "violations": violations,
+        "only_ours": [n for n in our_pos if n not in cargo_pos],
+        "only_cargo": [n for n in cargo_pos if n not in our_pos]
+    }